@@ -0,0 +1,112 @@
+"""Benchmark intents.near balance lookups as the asset map grows.
+
+Runs ``AgentSetup.create_agent_prompts(mock_balances=False)`` against a local
+NEAR JSON-RPC stand-in, once with per-token ``mt_balance_of`` calls and once
+with a single batched ``mt_batch_balance_of`` call. The async
+``acreate_agent_prompts`` path is measured the same way, using the pooled
+``AsyncNearRpcClient``.
+
+    python benchmarks/bench_balances.py --sizes 8 32 128 512 --latency 0.02
+"""
+
+import asyncio
+import os
+import time
+
+from common import base_parser, report, summarize, use_agent_dir
+from stubs import JsonRpcStandIn
+
+ACCOUNT_ID = "bench.near"
+
+
+def build_asset_map(base_map, size):
+    asset_map = dict(list(base_map.items())[:size])
+    for i in range(len(asset_map), size):
+        asset_map[f"TOKEN{i}"] = {
+            "token_id": f"nep141:token{i}.omft.near",
+            "decimals": 18,
+        }
+    return asset_map
+
+
+def time_builds(agent_setup, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        agent_setup.create_agent_prompts(mock_balances=False, mock_mindshare=True)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+async def time_async_builds(agent_setup, repeat):
+    # One event loop for all runs, like a long-lived server process
+    samples = []
+    async with agent_setup.rpc_client:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            await agent_setup.acreate_agent_prompts(
+                mock_balances=False, mock_mindshare=True
+            )
+            samples.append(time.perf_counter() - start)
+    return samples
+
+
+def main():
+    parser = base_parser(__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[8, 32, 128, 512])
+    parser.add_argument(
+        "--latency", type=float, default=0.02, help="Stand-in latency per request (s)"
+    )
+    args = parser.parse_args()
+    use_agent_dir(args.agent_dir)
+
+    import near_api
+    import setup
+    from constants import ASSET_MAP
+    from near_rpc import AsyncNearRpcClient
+
+    rows = []
+    for size in args.sizes:
+        asset_map = build_asset_map(ASSET_MAP, size)
+        setup.ASSET_MAP = asset_map
+        balances = {setup.get_asset_id(token): str(10**18) for token in asset_map}
+
+        with JsonRpcStandIn(balances, latency=args.latency) as server:
+            provider = near_api.providers.JsonProvider(server.url)
+            key_pair = near_api.signer.KeyPair(os.urandom(32))
+            signer = near_api.signer.Signer(ACCOUNT_ID, key_pair)
+            account = near_api.account.Account(provider, signer, ACCOUNT_ID)
+
+            for use_async in (False, True):
+                for batch in (False, True):
+                    agent_setup = setup.AgentSetup(
+                        None, None, None, batch_balances=batch
+                    )
+                    agent_setup.account = account
+                    agent_setup.rpc_client = AsyncNearRpcClient(server.url)
+                    requests_before = server.request_count
+                    if use_async:
+                        samples = asyncio.run(
+                            time_async_builds(agent_setup, args.repeat)
+                        )
+                    else:
+                        samples = time_builds(agent_setup, args.repeat)
+                    mode = "batched" if batch else "per-token"
+                    rows.append(
+                        {
+                            "assets": size,
+                            "mode": f"async-{mode}" if use_async else mode,
+                            "rpc_calls_per_build": (
+                                server.request_count - requests_before
+                            )
+                            / args.repeat,
+                            **summarize(samples),
+                        }
+                    )
+
+    setup.ASSET_MAP = ASSET_MAP
+    report(rows, args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+"""Benchmark what guardrails cost each mindshare agent end to end.
+
+Runs each agent's graph in its own subprocess, because the agents share
+module names. The graph runs against a local OpenAI-compatible stand-in, with
+guardrails off and on. Concurrent clients send requests for every
+combination of concurrency, conversation length (--messages) and message
+length (--input-chars). Each row reports throughput, p50/p95/p99 latency, and
+the mean time per request spent in input scans, model calls and output scans.
+Input scans of one request can overlap, so their time adds up every scan.
+
+Scans use an in-process Dome stand-in with --guard-latency, in which
+mindshare-langgraph's synchronous scans block a worker thread, or the real
+Dome with --real-dome. Pass --dome-config to compare DOME_CONFIG_PATH files.
+
+    python benchmarks/bench_guardrail_latency.py --concurrency 1 8 32 --json
+"""
+
+import asyncio
+import contextlib
+import io
+import json
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from common import AGENT_DIRS, base_parser, percentile, report, use_agent_dir
+from stubs import GuardStandIn, OpenAIStandIn
+
+
+class TimedDome:
+    """Wraps a Dome and adds up the time spent in its input and output scans"""
+
+    def __init__(self, dome):
+        self.dome = dome
+        self.times = {"input": 0.0, "output": 0.0}
+
+    def _timed(self, guard: str, fn):
+        def scan(text):
+            start = time.perf_counter()
+            try:
+                return fn(text)
+            finally:
+                self.times[guard] += time.perf_counter() - start
+
+        async def ascan(text):
+            start = time.perf_counter()
+            try:
+                return await fn(text)
+            finally:
+                self.times[guard] += time.perf_counter() - start
+
+        return ascan if asyncio.iscoroutinefunction(fn) else scan
+
+    def __getattr__(self, name):
+        attr = getattr(self.dome, name)
+        if name in ("guard_input", "async_guard_input"):
+            return self._timed("input", attr)
+        if name in ("guard_output", "async_guard_output"):
+            return self._timed("output", attr)
+        return attr
+
+
+def model_timer():
+    """A callback handler that adds up the time between each chat model call's start and end"""
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class ModelTimer(BaseCallbackHandler):
+        def __init__(self):
+            self.total = 0.0
+            self._started: Dict = {}
+
+        def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+            self._started[run_id] = time.perf_counter()
+
+        def on_llm_end(self, response, *, run_id, **kwargs):
+            started = self._started.pop(run_id, None)
+            if started is not None:
+                self.total += time.perf_counter() - started
+
+        on_llm_error = on_llm_end
+
+    return ModelTimer()
+
+
+async def run_cell(graph, dome, timer, concurrency, messages, input_chars, requests):
+    from langchain_core.messages import HumanMessage
+
+    text = ("What should I trade today given the mindshare trends? " * 64)[:input_chars]
+    conversations = [
+        [HumanMessage(content=f"{i}.{m} {text}") for m in range(messages)]
+        for i in range(requests)
+    ]
+    queue = iter(conversations)
+    latencies: List[float] = []
+
+    async def client():
+        for conversation in queue:
+            start = time.perf_counter()
+            await graph.ainvoke(
+                {"messages": conversation}, config={"callbacks": [timer]}
+            )
+            latencies.append(time.perf_counter() - start)
+
+    if dome is not None:
+        dome.times = {"input": 0.0, "output": 0.0}
+    timer.total = 0.0
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {
+        "requests": requests,
+        "throughput_rps": requests / elapsed,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "guard_input_ms": dome.times["input"] / requests * 1000 if dome else 0.0,
+        "model_ms": timer.total / requests * 1000,
+        "guard_output_ms": dome.times["output"] / requests * 1000 if dome else 0.0,
+    }
+
+
+def run_agent(args) -> List[Dict]:
+    """Benchmark the agent in --agent-dir in this process"""
+    agent_dir = use_agent_dir(args.agent_dir)
+
+    import agent
+    import dome_registry
+
+    if args.real_dome:
+        from vijil_dome import Dome
+    else:
+        guard = GuardStandIn(latency=args.guard_latency)
+        Dome = lambda config_path=None: guard  # noqa: E731
+    timed = {}
+
+    def timed_dome(config_path=None):
+        timed["dome"] = TimedDome(Dome(config_path))
+        return timed["dome"]
+
+    dome_registry.Dome = timed_dome
+    timer = model_timer()
+    # One event loop for every run: the model clients share a pooled HTTP client per base URL
+    loop = asyncio.new_event_loop()
+    rows = []
+    with OpenAIStandIn(latency=args.llm_latency) as llm:
+        for guardrails in (False, True):
+            with contextlib.redirect_stdout(io.StringIO()):
+                graph = agent._create_agent_graph(
+                    base_url=llm.base_url,
+                    model_api_key="bench",
+                    use_dome_guardrails=guardrails,
+                    warmup_dome=args.real_dome,
+                    dome_config_path=args.dome_config,
+                )
+            for concurrency in args.concurrency:
+                for messages in args.messages:
+                    for input_chars in args.input_chars:
+                        cell = loop.run_until_complete(
+                            run_cell(
+                                graph,
+                                timed.get("dome") if guardrails else None,
+                                timer,
+                                concurrency,
+                                messages,
+                                input_chars,
+                                args.requests,
+                            )
+                        )
+                        rows.append(
+                            {
+                                "agent": agent_dir.name,
+                                "guardrails": guardrails,
+                                "concurrency": concurrency,
+                                "messages": messages,
+                                "input_chars": input_chars,
+                                **cell,
+                            }
+                        )
+    return rows
+
+
+def main():
+    parser = base_parser(__doc__.splitlines()[0])
+    parser.add_argument("--agents", nargs="+", default=AGENT_DIRS, choices=AGENT_DIRS)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--messages", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--input-chars", type=int, nargs="+", default=[100, 2000])
+    parser.add_argument(
+        "--requests", type=int, default=64, help="Requests per configuration"
+    )
+    parser.add_argument(
+        "--llm-latency", type=float, default=0.2, help="Stand-in model latency (s)"
+    )
+    parser.add_argument(
+        "--guard-latency", type=float, default=0.05, help="Stand-in scan latency (s)"
+    )
+    parser.add_argument(
+        "--real-dome", action="store_true", help="Scan with vijil_dome.Dome"
+    )
+    parser.add_argument(
+        "--dome-config", default=None, help="DOME_CONFIG_PATH for --real-dome"
+    )
+    parser.add_argument(
+        "--worker", action="store_true", help="Benchmark --agent-dir in this process"
+    )
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_agent(args)))
+        return
+
+    rows = []
+    for agent_dir in args.agents:
+        # Everything but --agents, --json and the agent to run is passed on to the worker
+        forwarded = [
+            arg for arg in sys.argv[1:] if arg not in ("--json",)
+        ]
+        forwarded = _drop_option(forwarded, "--agents")
+        forwarded = _drop_option(forwarded, "--agent-dir")
+        worker = subprocess.run(
+            [sys.executable, str(Path(__file__).resolve()), "--worker"]
+            + ["--agent-dir", agent_dir]
+            + forwarded,
+            stdout=subprocess.PIPE,
+            check=True,
+            text=True,
+        )
+        rows.extend(json.loads(worker.stdout.strip().splitlines()[-1]))
+    report(rows, args.json)
+
+
+def _drop_option(argv: List[str], option: str) -> List[str]:
+    """argv without option and the values that follow it"""
+    kept, skipping = [], False
+    for arg in argv:
+        if arg == option or arg.startswith(option + "="):
+            skipping = arg == option
+            continue
+        if skipping and not arg.startswith("--"):
+            continue
+        skipping = False
+        kept.append(arg)
+    return kept
+
+
+if __name__ == "__main__":
+    main()
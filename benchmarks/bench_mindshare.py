@@ -0,0 +1,94 @@
+"""Benchmark Kaito mindshare fetching for portfolios of increasing size.
+
+Compares the original one-``requests.get``-per-token loop with the pooled
+``KaitoClient`` at several concurrency caps, through both the thread-pool
+(``get_mindshares``) and asyncio (``aget_mindshares``) paths, against a local
+Kaito stand-in with injected latency. The stand-in speaks plain HTTP, so the
+TLS handshakes saved by connection reuse are not part of these numbers.
+
+    python benchmarks/bench_mindshare.py --tokens 4 16 64 --latency 0.05
+"""
+
+import asyncio
+import contextlib
+import io
+import time
+
+import requests
+
+from common import base_parser, report, summarize, use_agent_dir
+from stubs import KaitoStandIn
+
+
+def legacy_fetch(base_url, tokens):
+    """The original AgentSetup._get_kaito_mindshare loop: one fresh request per token"""
+    for token in tokens:
+        response = requests.get(
+            f"{base_url}/mindshare?token={token}", headers={"x-api-key": "bench"}
+        )
+        response.json()
+
+
+def main():
+    parser = base_parser(__doc__.splitlines()[0])
+    parser.add_argument("--tokens", type=int, nargs="+", default=[4, 16, 64])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument(
+        "--latency", type=float, default=0.05, help="Stand-in latency per request (s)"
+    )
+    args = parser.parse_args()
+    use_agent_dir(args.agent_dir)
+
+    from kaito import KaitoClient
+
+    # One event loop for every asyncio run, like a long-lived server process
+    loop = asyncio.new_event_loop()
+    rows = []
+    with KaitoStandIn(latency=args.latency) as server:
+        for count in args.tokens:
+            tokens = [f"TOKEN{i}" for i in range(count)]
+            runs = [("legacy-serial", None, lambda: legacy_fetch(server.base_url, tokens))]
+            clients = []
+            for concurrency in args.concurrency:
+                client = KaitoClient(
+                    "bench", base_url=server.base_url, max_concurrency=concurrency
+                )
+                clients.append(client)
+                runs.append(
+                    ("threads", concurrency, lambda c=client: c.get_mindshares(tokens))
+                )
+                runs.append(
+                    (
+                        "asyncio",
+                        concurrency,
+                        lambda c=client: loop.run_until_complete(
+                            c.aget_mindshares(tokens)
+                        ),
+                    )
+                )
+
+            for mode, concurrency, run in runs:
+                samples = []
+                for _ in range(args.repeat):
+                    start = time.perf_counter()
+                    # KaitoClient logs every response; keep the report readable
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        run()
+                    samples.append(time.perf_counter() - start)
+                rows.append(
+                    {
+                        "tokens": count,
+                        "mode": mode,
+                        "concurrency": concurrency or 1,
+                        **summarize(samples),
+                    }
+                )
+            for client in clients:
+                loop.run_until_complete(client.aclose())
+
+    loop.close()
+    report(rows, args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""Benchmark the multi-personality agent's local router against the LLM router.
+
+Routes every query of the bundled held-out evaluation set
+(multi-personality-agent-langgraph/router_data/eval.jsonl) with the local
+hashed n-gram router at several confidence thresholds. Tune the threshold with
+--split dev, which uses router_data/dev.jsonl instead, and keep the eval split
+for reporting. Each row reports
+accuracy against the labels and the share of queries that would fall back to
+the LLM, both for the in-domain queries, and the share of the out-of-domain and
+very short queries that the router would confidently send to a wrong
+personality. With --llm the queries are also classified by the agent's LLM
+router, which needs REDPILL_API_KEY. Rows then also report how often the two
+routers agree and the latency saved per turn.
+
+    python benchmarks/bench_personality_router.py --thresholds 0.5 0.6 0.65 --llm
+"""
+
+import argparse
+import statistics
+import sys
+import time
+
+from common import REPO_ROOT, report, summarize
+
+AGENT_DIR = REPO_ROOT / "multi-personality-agent-langgraph"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--thresholds", type=float, nargs="+", default=[0.0, 0.5, 0.6, 0.65, 0.7]
+    )
+    parser.add_argument(
+        "--split",
+        choices=["eval", "dev"],
+        default="eval",
+        help="Held-out split to route: dev for tuning the threshold, eval for reporting",
+    )
+    parser.add_argument(
+        "--llm", action="store_true", help="Also classify with the LLM router"
+    )
+    parser.add_argument(
+        "--json", action="store_true", help="Print machine-readable JSON results"
+    )
+    args = parser.parse_args()
+    sys.path.insert(0, str(AGENT_DIR))
+
+    from router import DEV_PATH, EVAL_PATH, get_router, load_eval_examples
+
+    start = time.perf_counter()
+    router = get_router()
+    load_ms = (time.perf_counter() - start) * 1000
+    examples = load_eval_examples(DEV_PATH if args.split == "dev" else EVAL_PATH)
+    in_domain = [example.in_domain for example in examples]
+    out_of_domain = len(examples) - sum(in_domain)
+
+    routes, local_times = [], []
+    for text, _, _ in examples:
+        start = time.perf_counter()
+        routes.append(router.route(text))
+        local_times.append(time.perf_counter() - start)
+
+    llm_choices, llm_times = None, []
+    if args.llm:
+        from agent import classify_personality_with_llm
+
+        llm_choices = []
+        for text, _, _ in examples:
+            start = time.perf_counter()
+            llm_choices.append(classify_personality_with_llm(text))
+            llm_times.append(time.perf_counter() - start)
+    llm_ms = statistics.fmean(llm_times) * 1000 if llm_times else None
+
+    rows = []
+    for threshold in args.thresholds:
+        local = [route.confidence >= threshold for route in routes]
+        # The personality the agent ends up with: the local route, or the LLM's for the fallbacks
+        chosen = [
+            route.personality if is_local or llm_choices is None else llm_choices[i]
+            for i, (route, is_local) in enumerate(zip(routes, local))
+        ]
+        local_correct = [
+            route.personality == label
+            for route, (_, label, domain), is_local in zip(routes, examples, local)
+            if is_local and domain
+        ]
+        local_wrong_out_of_domain = sum(
+            route.personality != label
+            for route, (_, label, domain), is_local in zip(routes, examples, local)
+            if is_local and not domain
+        )
+        row = {
+            "threshold": threshold,
+            "queries": len(examples),
+            "local_share": (
+                sum(is_local for is_local, domain in zip(local, in_domain) if domain)
+                / sum(in_domain)
+            ),
+            "local_accuracy": (
+                sum(local_correct) / len(local_correct) if local_correct else 0.0
+            ),
+            "ood_local_wrong": (
+                local_wrong_out_of_domain / out_of_domain if out_of_domain else 0.0
+            ),
+            "local_p50_us": summarize(local_times)["p50_ms"] * 1000,
+        }
+        if llm_choices is not None:
+            row["accuracy"] = sum(
+                choice == label for choice, (_, label, _) in zip(chosen, examples)
+            ) / len(examples)
+            row["llm_accuracy"] = sum(
+                choice == label for choice, (_, label, _) in zip(llm_choices, examples)
+            ) / len(examples)
+            row["agreement_with_llm"] = sum(
+                route.personality == choice
+                for route, choice in zip(routes, llm_choices)
+            ) / len(examples)
+            row["llm_ms"] = llm_ms
+            row["saved_ms_per_turn"] = llm_ms * sum(local) / len(examples)
+        rows.append(row)
+    if not args.json:
+        print(f"Router ready in {load_ms:.0f}ms")
+    report(rows, args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Benchmark how much of each LLM request a provider prompt cache could reuse.
+
+Runs the agent graph against a local OpenAI-compatible stand-in with the
+original prompt layout and with STABLE_PROMPT_PREFIX, refreshing the portfolio
+context with a new mock portfolio between requests. For every request it reports
+the share of the serialized messages that matches the start of an earlier
+request, which is the part a prefix or KV cache can serve, and how many
+distinct prefix hashes the agent reported.
+
+    python benchmarks/bench_prompt_prefix.py --requests 20
+"""
+
+import asyncio
+import contextlib
+import io
+import json
+import random
+import statistics
+
+from common import base_parser, report, use_agent_dir
+from stubs import OpenAIStandIn
+
+
+def common_prefix_length(a: str, b: str) -> int:
+    limit = min(len(a), len(b))
+    for i in range(limit):
+        if a[i] != b[i]:
+            return i
+    return limit
+
+
+def reusable_prefix_ratios(requests):
+    """For each request after the first, the longest shared prefix with any earlier request over its length"""
+    serialized = [json.dumps(request["messages"]) for request in requests]
+    ratios = []
+    for i in range(1, len(serialized)):
+        shared = max(common_prefix_length(serialized[i], earlier) for earlier in serialized[:i])
+        ratios.append(shared / len(serialized[i]))
+    return ratios
+
+
+async def run_layout(agent, constants, server, stable_prefix, use_single_prompt, count):
+    from langchain_core.messages import HumanMessage
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        graph = agent._create_agent_graph(
+            base_url=server.base_url,
+            model_api_key="bench",
+            mock_balances=True,
+            mock_mindshare=True,
+            use_single_prompt=use_single_prompt,
+            stable_prompt_prefix=stable_prefix,
+            use_dome_guardrails=False,
+        )
+    rng = random.Random(0)
+    tokens = [t for t in constants.ASSET_MAP if t in constants.MOCK_MINDSHARES]
+    first_request = len(server.requests)
+    hashes = set()
+    for _ in range(count):
+        # A new portfolio, as a background refresh would pick up after trades
+        held = rng.sample(tokens, rng.randint(2, len(tokens)))
+        constants.MOCK_BALANCES.clear()
+        for token in tokens:
+            if token in held:
+                constants.MOCK_BALANCES[token] = round(rng.uniform(0, 1000), 4)
+        with contextlib.redirect_stdout(io.StringIO()):
+            await graph.context_refresher.refresh()
+            result = await graph.ainvoke(
+                {"messages": [HumanMessage(content="What should I trade today?")]}
+            )
+        hashes.add(result["messages"][-1].response_metadata["prompt_prefix_hash"])
+    requests = server.requests[first_request:]
+    ratios = reusable_prefix_ratios(requests)
+    return {
+        "layout": "stable-prefix" if stable_prefix else "original",
+        "single_prompt": use_single_prompt,
+        "requests": count,
+        "prefix_hashes": len(hashes),
+        "prompt_chars": statistics.fmean(len(json.dumps(r["messages"])) for r in requests),
+        "reusable_pct": statistics.fmean(ratios) * 100 if ratios else 0.0,
+    }
+
+
+def main():
+    parser = base_parser(__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20)
+    args = parser.parse_args()
+    use_agent_dir(args.agent_dir)
+
+    import agent
+    import constants
+
+    original_balances = dict(constants.MOCK_BALANCES)
+    rows = []
+    with OpenAIStandIn() as server:
+        for use_single_prompt in (True, False):
+            for stable_prefix in (False, True):
+                rows.append(
+                    asyncio.run(
+                        run_layout(
+                            agent,
+                            constants,
+                            server,
+                            stable_prefix,
+                            use_single_prompt,
+                            args.requests,
+                        )
+                    )
+                )
+                constants.MOCK_BALANCES.clear()
+                constants.MOCK_BALANCES.update(original_balances)
+    report(rows, args.json)
+
+
+if __name__ == "__main__":
+    main()
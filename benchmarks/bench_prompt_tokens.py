@@ -0,0 +1,91 @@
+"""Benchmark prompt size of the prose and compact portfolio context formats.
+
+Builds the agent prompts for synthetic portfolios of increasing size, where
+every asset in the asset map is held and has a mindshare value, and counts the
+input tokens of the original one-sentence-per-token context against
+COMPACT_CONTEXT. Tokens are counted with tiktoken when its encoding can be
+loaded, otherwise estimated at four characters per token (the `tokenizer`
+column says which).
+
+    python benchmarks/bench_prompt_tokens.py --sizes 4 16 64 500
+"""
+
+import random
+import time
+
+from common import base_parser, report, use_agent_dir
+
+
+def token_counter(encoding_name: str):
+    try:
+        import tiktoken
+
+        encoding = tiktoken.get_encoding(encoding_name)
+        return encoding_name, lambda text: len(encoding.encode(text))
+    except Exception:
+        return "chars/4", lambda text: len(text) // 4
+
+
+def main():
+    parser = base_parser(__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[4, 16, 64, 128, 500])
+    parser.add_argument("--encoding", default="o200k_base")
+    parser.add_argument("--trends", action="store_true", help="Include trend statistics")
+    args = parser.parse_args()
+    use_agent_dir(args.agent_dir)
+
+    import setup
+
+    tokenizer, count_tokens = token_counter(args.encoding)
+    agent_setup = setup.AgentSetup(None, None, "mainnet")
+    rng = random.Random(0)
+    original_asset_map = setup.ASSET_MAP
+    rows = []
+    try:
+        for size in args.sizes:
+            tokens = [f"TKN{i}" for i in range(size)]
+            setup.ASSET_MAP = {token: {"token_id": f"nep141:{token.lower()}"} for token in tokens}
+            balances = {token: round(rng.uniform(0, 10000), 6) for token in tokens}
+            mindshares = {token: {"mindshare": round(rng.random(), 4)} for token in tokens}
+            trends = None
+            if args.trends:
+                trends = {
+                    token: {
+                        "latest": mindshares[token]["mindshare"],
+                        "delta": rng.uniform(-0.1, 0.1),
+                        "moving_average": rng.random(),
+                        "zscore": rng.uniform(-3, 3),
+                    }
+                    for token in tokens
+                }
+
+            baseline = None
+            for compact in (False, True):
+                start = time.perf_counter()
+                for _ in range(args.repeat):
+                    system_prompt, prompts = agent_setup._format_agent_prompts(
+                        balances, mindshares, True, trends, compact=compact
+                    )
+                format_ms = (time.perf_counter() - start) / args.repeat * 1000
+                text = "\n".join([system_prompt, *prompts])
+                tokens_used = count_tokens(text)
+                baseline = baseline or tokens_used
+                rows.append(
+                    {
+                        "assets": size,
+                        "format": "compact" if compact else "prose",
+                        "tokenizer": tokenizer,
+                        "chars": len(text),
+                        "tokens": tokens_used,
+                        "tokens_per_asset": tokens_used / size,
+                        "saved_pct": (1 - tokens_used / baseline) * 100,
+                        "format_ms": format_ms,
+                    }
+                )
+    finally:
+        setup.ASSET_MAP = original_asset_map
+    report(rows, args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Benchmark speculative model calls that overlap the input guardrail.
+
+Sends a stream of requests through the agent graph, with a share of them
+(--block-rate) carrying a message the guard flags. The graph runs against a
+local OpenAI-compatible stand-in and an in-process Dome stand-in, with and
+without SPECULATIVE_LLM_CALL. The report shows the latency of clean requests
+and the share of model tokens spent on requests that were then blocked. The
+stand-in counts a model call as soon as it arrives, so a call cancelled in
+flight still counts as wasted, as it may with a real provider.
+
+    python benchmarks/bench_speculative.py --requests 50 --block-rate 0.1
+"""
+
+import asyncio
+import contextlib
+import io
+import random
+import statistics
+import time
+
+from common import base_parser, report, summarize, use_agent_dir
+from stubs import GuardStandIn, OpenAIStandIn
+
+
+async def run_mode(agent, llm, guard, speculative, args):
+    from langchain_core.messages import HumanMessage
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        graph = agent._create_agent_graph(
+            base_url=llm.base_url,
+            model_api_key="bench",
+            use_dome_guardrails=True,
+            warmup_dome=False,
+            speculative_llm_call=speculative,
+        )
+    rng = random.Random(0)
+    first_request = len(llm.requests)
+    clean, blocked = [], []
+    for i in range(args.requests):
+        flagged = rng.random() < args.block_rate
+        content = guard.flag_word if flagged else f"Request {i}: what should I trade?"
+        start = time.perf_counter()
+        await graph.ainvoke({"messages": [HumanMessage(content=content)]})
+        (blocked if flagged else clean).append(time.perf_counter() - start)
+    # Let cancelled calls that were already sent reach the stand-in
+    await asyncio.sleep(0.05)
+
+    def tokens(request):
+        return sum(len(str(m.get("content", ""))) for m in request["messages"]) // 4
+
+    calls = llm.requests[first_request:]
+    wasted = [r for r in calls if guard.flag_word in str(r["messages"][-1]["content"])]
+    total_tokens = sum(tokens(r) for r in calls)
+    clean_summary = summarize(clean)
+    return {
+        "mode": "speculative" if speculative else "sequential",
+        "block_rate": args.block_rate,
+        "clean_mean_ms": clean_summary["mean_ms"],
+        "clean_p95_ms": clean_summary["p95_ms"],
+        "blocked_mean_ms": statistics.fmean(blocked) * 1000 if blocked else 0.0,
+        "llm_calls": len(calls),
+        "wasted_calls": len(wasted),
+        "wasted_token_pct": (
+            sum(tokens(r) for r in wasted) / total_tokens * 100 if total_tokens else 0.0
+        ),
+    }
+
+
+def main():
+    parser = base_parser(__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--block-rate", type=float, default=0.1)
+    parser.add_argument(
+        "--llm-latency", type=float, default=0.3, help="Stand-in model latency (s)"
+    )
+    parser.add_argument(
+        "--guard-latency", type=float, default=0.1, help="Stand-in scan latency (s)"
+    )
+    args = parser.parse_args()
+    use_agent_dir(args.agent_dir)
+
+    import agent
+    import dome_registry
+
+    guard = GuardStandIn(latency=args.guard_latency)
+    # Every graph built below scans with the stand-in instead of loading Dome models
+    dome_registry.Dome = lambda config_path=None: guard
+    # One event loop for both modes: the model clients share a pooled HTTP client per base URL
+    loop = asyncio.new_event_loop()
+    rows = []
+    with OpenAIStandIn(latency=args.llm_latency) as llm:
+        for speculative in (False, True):
+            rows.append(
+                loop.run_until_complete(run_mode(agent, llm, guard, speculative, args))
+            )
+    report(rows, args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Shared helpers for the benchmark scripts."""
+
+import argparse
+import json
+import statistics
+import sys
+from pathlib import Path
+from typing import Dict, List
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+AGENT_DIRS = ["mindshare-langgraph", "mindshare-langgraph-guardrailed"]
+
+
+def use_agent_dir(agent_dir: str):
+    """Make an agent's flat modules (setup, constants, agent) importable.
+
+    The agents share module names, so a benchmark process should only ever
+    load a single agent directory.
+    """
+    path = (REPO_ROOT / agent_dir).resolve()
+    if not path.is_dir():
+        raise ValueError(f"Agent directory {path} does not exist")
+    sys.path.insert(0, str(path))
+    return path
+
+
+def base_parser(description: str) -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument(
+        "--agent-dir",
+        default=AGENT_DIRS[0],
+        choices=AGENT_DIRS,
+        help="Agent directory to benchmark",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=5, help="Measured runs per configuration"
+    )
+    parser.add_argument(
+        "--json", action="store_true", help="Print machine-readable JSON results"
+    )
+    return parser
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """Latency summary in milliseconds"""
+    return {
+        "runs": len(samples),
+        "mean_ms": statistics.fmean(samples) * 1000 if samples else 0.0,
+        "p50_ms": percentile(samples, 50) * 1000,
+        "p95_ms": percentile(samples, 95) * 1000,
+        "p99_ms": percentile(samples, 99) * 1000,
+    }
+
+
+def report(rows: List[Dict], as_json: bool):
+    if as_json:
+        print(json.dumps(rows, indent=2))
+        return
+    if not rows:
+        return
+    columns = list(rows[0].keys())
+    widths = {
+        c: max(len(c), *(len(_fmt(row.get(c))) for row in rows)) for c in columns
+    }
+    print("  ".join(c.ljust(widths[c]) for c in columns))
+    for row in rows:
+        print("  ".join(_fmt(row.get(c)).ljust(widths[c]) for c in columns))
+
+
+def _fmt(value) -> str:
+    if isinstance(value, float):
+        return f"{value:.2f}"
+    return str(value)
@@ -0,0 +1,306 @@
+"""Local stand-ins for the upstream services the agents talk to.
+
+Each stand-in is a small threaded HTTP server that runs in the background of
+a benchmark process, answers with canned data and sleeps for a configurable
+latency before every response so that round trips can be compared.
+GuardStandIn plays the same role in-process for the Dome guardrail scanner.
+"""
+
+import asyncio
+import base64
+import json
+import threading
+import time
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import parse_qs, urlparse
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Send headers and body in one segment so keep-alive clients are not held up by delayed ACKs
+    wbufsize = 64 * 1024
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload, status: int = 200):
+        body = json.dumps(payload).encode("utf8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+
+class StandInServer(ThreadingHTTPServer):
+    """Base class: serve on a free localhost port from a daemon thread"""
+
+    daemon_threads = True
+    request_queue_size = 256
+    handler_class = _StandInHandler
+
+    def __init__(self, latency: float = 0.0):
+        super().__init__(("127.0.0.1", 0), self.handler_class)
+        self.latency = latency
+        self.request_count = 0
+        self._count_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def record_request(self):
+        with self._count_lock:
+            self.request_count += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
+
+
+class _JsonRpcHandler(_StandInHandler):
+    def do_POST(self):
+        self.server.record_request()
+        request = self._read_json()
+        try:
+            result = self.server.handle_rpc(request["method"], request["params"])
+        except KeyError as e:
+            self._send_json(
+                {
+                    "jsonrpc": "2.0",
+                    "id": request.get("id"),
+                    "error": {"code": -32000, "message": f"Unknown {e}"},
+                }
+            )
+            return
+        self._send_json({"jsonrpc": "2.0", "id": request.get("id"), "result": result})
+
+
+class JsonRpcStandIn(StandInServer):
+    """NEAR JSON-RPC stand-in that serves intents.near multi-token balances"""
+
+    handler_class = _JsonRpcHandler
+
+    def __init__(
+        self,
+        balances: Dict[str, str],
+        latency: float = 0.0,
+        block_height: int = 1,
+        support_batch: bool = True,
+    ):
+        super().__init__(latency)
+        self.balances = balances
+        self.block_height = block_height
+        self.support_batch = support_batch
+
+    def _call_function(self, params):
+        args = json.loads(base64.b64decode(params["args_base64"]) or b"{}")
+        method = params["method_name"]
+        if method == "mt_balance_of":
+            value = self.balances.get(args["token_id"], "0")
+        elif method == "mt_batch_balance_of" and self.support_batch:
+            value = [self.balances.get(t, "0") for t in args["token_ids"]]
+        else:
+            raise KeyError(method)
+        return {
+            "result": list(json.dumps(value).encode("utf8")),
+            "logs": [],
+            "block_height": self.block_height,
+            "block_hash": "11111111111111111111111111111111",
+        }
+
+    def handle_rpc(self, method, params):
+        if method == "status":
+            return {"sync_info": {"latest_block_height": self.block_height}}
+        if method == "block":
+            return {"header": {"height": self.block_height}}
+        request_type = params["request_type"]
+        if request_type == "call_function":
+            return self._call_function(params)
+        if request_type == "view_account":
+            return {"amount": "0", "locked": "0", "code_hash": "1" * 32}
+        if request_type == "view_access_key":
+            return {"nonce": 0, "permission": "FullAccess"}
+        raise KeyError(request_type)
+
+
+class _KaitoHandler(_StandInHandler):
+    def do_GET(self):
+        self.server.record_request()
+        url = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        if not url.path.endswith("/mindshare") or "token" not in query:
+            self._send_json({"error": "not found"}, status=404)
+            return
+        self._send_json(self.server.mindshare_response(query))
+
+
+class KaitoStandIn(StandInServer):
+    """Kaito mindshare API stand-in that returns a deterministic value per token and day"""
+
+    handler_class = _KaitoHandler
+
+    def mindshare_response(self, query):
+        token = query["token"]
+        start = date.fromisoformat(query.get("start_date", "1970-01-01"))
+        end = date.fromisoformat(query.get("end_date", start.isoformat()))
+        series = {}
+        day = start
+        while day <= end:
+            key = day.isoformat()
+            series[key] = (sum(map(ord, token + key)) % 1000) / 1000
+            day += timedelta(days=1)
+        return {"mindshare": series}
+
+    @property
+    def base_url(self) -> str:
+        return f"{self.url}/api/v1"
+
+
+class _OpenAIHandler(_StandInHandler):
+    def do_POST(self):
+        self.server.record_request()
+        request = self._read_json()
+        if not self.path.endswith("/chat/completions"):
+            self._send_json({"error": {"message": "not found"}}, status=404)
+            return
+        if request.get("stream"):
+            self._send_stream(request)
+            return
+        self._send_json(self.server.completion_response(request))
+
+    def _send_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _send_stream(self, request):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for event in self.server.stream_events(request):
+            self._send_chunk(f"data: {json.dumps(event)}\n\n".encode("utf8"))
+            if self.server.token_latency:
+                time.sleep(self.server.token_latency)
+        self._send_chunk(b"data: [DONE]\n\n")
+        self._send_chunk(b"")
+
+
+class OpenAIStandIn(StandInServer):
+    """OpenAI-compatible chat completions stand-in that records every request it receives"""
+
+    handler_class = _OpenAIHandler
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        reply: str = "TRADE:\n- token_in: USDC",
+        token_latency: float = 0.0,
+    ):
+        super().__init__(latency)
+        self.reply = reply
+        # Delay between streamed chunks; latency is the time to the first one
+        self.token_latency = token_latency
+        self.requests = []
+
+    def completion_response(self, request):
+        with self._count_lock:
+            self.requests.append(request)
+        prompt_chars = sum(len(str(m.get("content", ""))) for m in request["messages"])
+        return {
+            "id": f"chatcmpl-{len(self.requests)}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "stand-in"),
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": self.reply},
+                    "finish_reason": "stop",
+                }
+            ],
+            "usage": {
+                "prompt_tokens": prompt_chars // 4,
+                "completion_tokens": len(self.reply) // 4,
+                "total_tokens": (prompt_chars + len(self.reply)) // 4,
+            },
+        }
+
+    def stream_events(self, request):
+        """chat.completion.chunk events with one word of the reply each"""
+        with self._count_lock:
+            self.requests.append(request)
+        words = self.reply.split(" ")
+        for i, word in enumerate(words):
+            yield {
+                "id": f"chatcmpl-{len(self.requests)}",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": request.get("model", "stand-in"),
+                "choices": [
+                    {
+                        "index": 0,
+                        "delta": {"content": word if i == 0 else " " + word},
+                        "finish_reason": "stop" if i == len(words) - 1 else None,
+                    }
+                ],
+            }
+
+    @property
+    def base_url(self) -> str:
+        return f"{self.url}/v1"
+
+
+class _GuardScan:
+    def __init__(self, flagged: bool):
+        self.flagged = flagged
+
+
+class GuardStandIn:
+    """
+    In-process stand-in for a Vijil Dome instance. Every scan takes `latency`
+    seconds and flags any text that contains `flag_word`.
+    """
+
+    def __init__(self, latency: float = 0.05, flag_word: str = "FLAGGED"):
+        self.latency = latency
+        self.flag_word = flag_word
+        self.scan_count = 0
+        self._count_lock = threading.Lock()
+
+    def _scan(self, text: str) -> _GuardScan:
+        with self._count_lock:
+            self.scan_count += 1
+        return _GuardScan(self.flag_word in text)
+
+    def guard_input(self, text: str) -> _GuardScan:
+        time.sleep(self.latency)
+        return self._scan(text)
+
+    def guard_output(self, text: str) -> _GuardScan:
+        time.sleep(self.latency)
+        return self._scan(text)
+
+    async def async_guard_input(self, text: str) -> _GuardScan:
+        await asyncio.sleep(self.latency)
+        return self._scan(text)
+
+    async def async_guard_output(self, text: str) -> _GuardScan:
+        await asyncio.sleep(self.latency)
+        return self._scan(text)
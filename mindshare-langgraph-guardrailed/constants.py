@@ -89,3 +89,37 @@ MOCK_MINDSHARES = {
 
 GUARDRAILS_INPUT_BLOCKED_MESSAGE = "I'm sorry, but this request is in violation of my operating policies. I cannot answer it."
 GUARDRAILS_OUTPUT_BLOCKED_MESSAGE = "I'm sorry, but the response to this request is in violation of my operating policies. I cannot respond to this request."
+
+# Days in the moving average of mindshare trends, capped at the trend period
+TREND_AVERAGE_DAYS = 7
+
+# Mindshare lookups that miss the prompt deadline are reported with this error
+DEADLINE_EXCEEDED_ERROR = "Deadline exceeded"
+
+# Shown in place of the portfolio when the balance lookup missed the deadline and no earlier balances are known
+BALANCES_UNAVAILABLE = "balances unavailable (the balance lookup timed out), so the holdings are unknown"
+
+# With a stable prompt prefix, the template refers to the portfolio instead of listing it, so that the
+# instructions stay byte-identical between requests and the portfolio follows them
+PORTFOLIO_SECTION_REFERENCE = "the portfolio listed below"
+
+# Words of the short, benign trade questions that the guard pre-filter may approve without a Dome scan.
+# Texts with any other word are scanned
+PREFILTER_ALLOW_WORDS = frozenset(
+    [symbol.lower() for symbol in ASSET_MAP]
+    + """
+    a about all am an and any are at be best buy buying can could do does for from give have how i
+    in into is it its me mindshare more most my now of on or portfolio price rebalance recommend
+    sell selling should swap swapping to today token tokens trade trades trading what which why
+    with would you your hi hello thanks please much many some one trend trending
+    """.split()
+)
+
+# Phrases the guard pre-filter blocks without a Dome scan
+PREFILTER_DENY_PATTERNS = [
+    r"\bignore (all |any |the )?(previous|prior|above|earlier) (instructions|prompts?|rules)\b",
+    r"\b(disregard|forget) (all |any |the |your )?(previous |prior )?(instructions|rules|guidelines)\b",
+    r"\b(reveal|print|show|repeat) (me )?(your|the) (system )?(prompt|instructions)\b",
+    r"\byou are now (in )?(dan|developer mode|jailbroken)\b",
+    r"\bjailbreak\b",
+]
@@ -0,0 +1,119 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, Optional
+
+from vijil_dome import Dome
+
+WARMUP_INPUT = "This is an input guardrail warmup query"
+WARMUP_OUTPUT = "This is an output guardrail warmup query"
+
+
+class _Entry:
+    def __init__(self):
+        self.dome: Optional[Dome] = None
+        self.lock = threading.Lock()
+        self.warmup: Optional[Future] = None
+        self.load_ms: Optional[float] = None
+        self.warmup_ms: Optional[float] = None
+        self.error: Optional[str] = None
+
+
+class DomeRegistry:
+    """
+    One Dome per config path for the whole process, shared by every graph.
+
+    get() creates the Dome on first use. warm() also runs one input and one output scan so that models
+    are loaded and downloaded before real traffic; start_warmup() does it on a background thread and
+    wait_ready() lets a coroutine await it. status() reports readiness and load and warm-up times, so a
+    serving layer can hold traffic until the guardrails are hot.
+    """
+
+    def __init__(self):
+        self._entries: Dict[Optional[str], _Entry] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(thread_name_prefix="dome-warmup")
+
+    def _entry(self, config_path: Optional[str]) -> _Entry:
+        with self._lock:
+            if config_path not in self._entries:
+                self._entries[config_path] = _Entry()
+            return self._entries[config_path]
+
+    def get(self, config_path: Optional[str] = None) -> Dome:
+        entry = self._entry(config_path)
+        with entry.lock:
+            if entry.dome is None:
+                start = time.perf_counter()
+                entry.dome = Dome(config_path)
+                entry.load_ms = (time.perf_counter() - start) * 1000
+            return entry.dome
+
+    def _warm(self, config_path: Optional[str]) -> Dome:
+        entry = self._entry(config_path)
+        try:
+            dome = self.get(config_path)
+            start = time.perf_counter()
+            dome.guard_input(WARMUP_INPUT)
+            dome.guard_output(WARMUP_OUTPUT)
+            entry.warmup_ms = (time.perf_counter() - start) * 1000
+            print(
+                f"Dome ready for config {config_path or 'default'}: "
+                f"loaded in {entry.load_ms:.0f}ms, warmed up in {entry.warmup_ms:.0f}ms"
+            )
+            return dome
+        except Exception as e:
+            entry.error = str(e)
+            print(f"Error warming up Dome: {str(e)}")
+            raise
+
+    def start_warmup(self, config_path: Optional[str] = None) -> Future:
+        """
+        Warm up the Dome for config_path on a background thread, once per process. A warm-up that failed is
+        started again, so a transient load or download error does not disable the guardrails for good
+        """
+        entry = self._entry(config_path)
+        with entry.lock:
+            failed = (
+                entry.warmup is not None
+                and entry.warmup.done()
+                and entry.warmup.exception() is not None
+            )
+            if entry.warmup is None or failed:
+                entry.error = None
+                entry.warmup = self._executor.submit(self._warm, config_path)
+            return entry.warmup
+
+    def warm(self, config_path: Optional[str] = None) -> Dome:
+        """Warm up the Dome for config_path and wait for it"""
+        return self.start_warmup(config_path).result()
+
+    async def wait_ready(
+        self, config_path: Optional[str] = None, timeout: Optional[float] = None
+    ) -> Dome:
+        """Await the warm-up of the Dome for config_path, starting it if needed"""
+        return await asyncio.wait_for(
+            asyncio.wrap_future(self.start_warmup(config_path)), timeout
+        )
+
+    def is_ready(self, config_path: Optional[str] = None) -> bool:
+        warmup = self._entry(config_path).warmup
+        return warmup is not None and warmup.done() and warmup.exception() is None
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            entries = dict(self._entries)
+        return {
+            config_path or "default": {
+                "ready": self.is_ready(config_path),
+                "load_ms": entry.load_ms,
+                "warmup_ms": entry.warmup_ms,
+                "error": entry.error,
+            }
+            for config_path, entry in entries.items()
+        }
+
+
+# Shared by every graph in the process
+DOME_REGISTRY = DomeRegistry()
@@ -0,0 +1,109 @@
+import hashlib
+import json
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+from singleflight import SingleFlight
+
+
+def config_key(config: Dict[str, Any]) -> str:
+    """Stable key for a graph configuration. Hashed so that API keys are not kept readable in the cache"""
+    encoded = json.dumps(config, sort_keys=True, default=str).encode("utf8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+class GraphCache:
+    """
+    LRU of compiled agent graphs keyed by their effective configuration.
+
+    Building a graph fetches balances and mindshare, creates the model client and loads Dome, so repeated
+    calls with the same configuration return the graph that is already compiled. Concurrent calls for a
+    configuration that is not built yet share one build. Graphs beyond max_size are only dropped from the
+    cache, since callers may still use them; their resources are released once they are garbage-collected
+    (see release_when_collected). Graphs dropped with invalidate are shut down right away: their background
+    context refresh is stopped and their AgentSetup closed.
+    """
+
+    def __init__(self, max_size: int = 4):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._graphs: "OrderedDict[str, Any]" = OrderedDict()
+        self._flights = SingleFlight("graphs")
+        self._lock = threading.Lock()
+
+    def get_or_build(
+        self, config: Dict[str, Any], build: Callable[..., Any]
+    ):
+        """The graph built with build(**config), building it if it is not cached"""
+        key = config_key(config)
+        with self._lock:
+            graph = self._graphs.get(key)
+            if graph is not None:
+                self._graphs.move_to_end(key)
+                self.hits += 1
+                return graph
+            self.misses += 1
+        return self._flights.do(key, lambda: self._build(key, config, build))
+
+    def _build(self, key: str, config: Dict[str, Any], build: Callable[..., Any]):
+        graph = build(**config)
+        with self._lock:
+            self._graphs[key] = graph
+            while len(self._graphs) > self.max_size:
+                self._graphs.popitem(last=False)
+                self.evictions += 1
+        return graph
+
+    def invalidate(self, config: Optional[Dict[str, Any]] = None):
+        """Drop and shut down the graph for one configuration, or every graph"""
+        with self._lock:
+            if config is None:
+                dropped = list(self._graphs.values())
+                self._graphs.clear()
+            else:
+                graph = self._graphs.pop(config_key(config), None)
+                dropped = [graph] if graph is not None else []
+        for graph in dropped:
+            _release(graph)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "graphs": len(self._graphs),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+def _release_resources(refresher, agent_setup):
+    if refresher is not None:
+        refresher.stop()
+    if agent_setup is not None:
+        agent_setup.close()
+
+
+def _release(graph):
+    release = getattr(graph, "release_resources", None)
+    if release is not None:
+        # Runs the finalizer now, so it does not run again when the graph is collected
+        release()
+    else:
+        _release_resources(
+            getattr(graph, "context_refresher", None), getattr(graph, "agent_setup", None)
+        )
+
+
+def release_when_collected(graph):
+    """Stop the context refresh and close the AgentSetup of a graph once nothing references the graph"""
+    graph.release_resources = weakref.finalize(
+        graph,
+        _release_resources,
+        getattr(graph, "context_refresher", None),
+        getattr(graph, "agent_setup", None),
+    )
@@ -0,0 +1,517 @@
+import asyncio
+import hashlib
+import re
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from importlib import metadata
+from pathlib import Path
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Hashable,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+)
+
+Scan = Callable[[str], Awaitable[Any]]
+
+
+class _Flagged(Exception):
+    def __init__(self, scan):
+        self.scan = scan
+
+
+async def scan_inputs(
+    scan: Scan,
+    contents: List[str],
+    max_concurrency: int = 4,
+) -> Optional[Any]:
+    """
+    Run scan on every input concurrently, at most max_concurrency at a time.
+
+    Returns the first scan result that is flagged, cancelling the scans still running or waiting, or None
+    if nothing was flagged. An exception raised by a scan cancels the others and is raised.
+    """
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def scan_one(content: str):
+        async with semaphore:
+            result = await scan(content)
+        if result.flagged:
+            raise _Flagged(result)
+
+    tasks = [asyncio.ensure_future(scan_one(content)) for content in contents]
+    try:
+        await asyncio.gather(*tasks)
+    except _Flagged as flagged:
+        return flagged.scan
+    finally:
+        for task in tasks:
+            task.cancel()
+    return None
+
+
+_SENTENCE_ENDS = (". ", "! ", "? ", "\n")
+
+
+def _last_sentence_end(text: str) -> int:
+    """Length of the longest prefix of text that ends a sentence, or 0"""
+    return max(text.rfind(end) + len(end) if end in text else 0 for end in _SENTENCE_ENDS)
+
+
+async def stream_guarded_output(
+    chunks: AsyncIterator[str],
+    scan: Optional[Scan],
+    release: Callable[[str], Awaitable[None]],
+    window_chars: int = 400,
+    overlap_chars: int = 100,
+) -> Tuple[str, Optional[Any]]:
+    """
+    Consume a stream of output text, releasing it in scanned segments as it arrives.
+
+    Once window_chars of unreleased text have arrived, the text up to the last sentence end is scanned
+    together with the overlap_chars before it, so phrases split across segments are still seen, and
+    released if clean. A flagged window stops the stream. When the stream ends the whole text is
+    scanned before the rest is released, so the verdict is the same as for a whole-response scan.
+    Returns the full text and the flagged scan result, or None if nothing was flagged.
+    """
+    text = ""
+    released = 0
+    try:
+        async for chunk in chunks:
+            text += chunk
+            pending = text[released:]
+            if scan is None:
+                await release(pending)
+                released = len(text)
+                continue
+            if len(pending) < window_chars:
+                continue
+            cut = _last_sentence_end(pending) or len(pending)
+            window = text[max(0, released - overlap_chars) : released + cut]
+            result = await scan(window)
+            if result.flagged:
+                return text, result
+            await release(text[released : released + cut])
+            released += cut
+    finally:
+        # Stops the model stream when a window was flagged
+        aclose = getattr(chunks, "aclose", None)
+        if aclose is not None:
+            await aclose()
+    if scan is not None:
+        result = await scan(text)
+        if result.flagged:
+            return text, result
+    if released < len(text):
+        await release(text[released:])
+    return text, None
+
+
+BatchScan = Callable[[List[str]], Awaitable[List[Any]]]
+
+
+class _Batch:
+    def __init__(self):
+        self.items: List[Tuple[str, asyncio.Future]] = []
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+
+class MicroBatcher:
+    """
+    Collects the texts that concurrent requests scan into batches, so that scanners that are faster per
+    text on a batch get one.
+
+    A batch is sent to scan_batch once max_batch texts are waiting, or max_wait seconds after its first
+    text arrived, and each result goes back to the coroutine that asked for it. Texts whose caller was
+    cancelled in the meantime are left out. batch_sizes counts the batches sent by their size.
+    """
+
+    def __init__(self, scan_batch: BatchScan, max_batch: int = 16, max_wait: float = 0.005):
+        self.scan_batch = scan_batch
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait
+        self.batch_sizes: Dict[int, int] = {}
+        self._batches: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _Batch]" = (
+            weakref.WeakKeyDictionary()
+        )
+
+    async def scan(self, content: str):
+        loop = asyncio.get_running_loop()
+        batch = self._batches.setdefault(loop, _Batch())
+        future = loop.create_future()
+        batch.items.append((content, future))
+        if len(batch.items) >= self.max_batch:
+            self._flush(loop)
+        elif batch.timer is None:
+            batch.timer = loop.call_later(self.max_wait, self._flush, loop)
+        return await future
+
+    def _flush(self, loop: asyncio.AbstractEventLoop):
+        batch = self._batches.pop(loop, None)
+        if batch is None:
+            return
+        if batch.timer is not None:
+            batch.timer.cancel()
+        items = [(content, future) for content, future in batch.items if not future.done()]
+        if items:
+            loop.create_task(self._run(items))
+
+    async def _run(self, items: List[Tuple[str, asyncio.Future]]):
+        self.batch_sizes[len(items)] = self.batch_sizes.get(len(items), 0) + 1
+        try:
+            results = await self.scan_batch([content for content, _ in items])
+        except Exception as e:
+            for _, future in items:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(items, results):
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        batches = sum(self.batch_sizes.values())
+        texts = sum(size * count for size, count in self.batch_sizes.items())
+        return {
+            "batches": batches,
+            "texts": texts,
+            "mean_batch_size": texts / batches if batches else 0.0,
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000,
+            "batch_sizes": dict(sorted(self.batch_sizes.items())),
+        }
+
+
+class PreFilterVerdict(NamedTuple):
+    """A verdict of the guard pre-filter, shaped like the Dome scan results the agent reads"""
+
+    flagged: bool
+    response_string: str
+    rule: str
+
+
+def normalize_text(text: str) -> str:
+    """Lower case, punctuation turned into spaces and whitespace collapsed, so trivial variants match"""
+    return " ".join(re.sub(r"[^\w\s]", " ", text.lower()).split())
+
+
+def _text_hash(text: str) -> str:
+    return hashlib.sha256(normalize_text(text).encode("utf8")).hexdigest()
+
+
+class GuardPreFilter:
+    """
+    Cheap first tier of a guard, which decides clear cases in process and leaves the rest to Dome.
+
+    Texts whose normalized hash is in the deny list, or that match a deny pattern, are flagged. Texts in
+    the allow list, or of at most max_allow_chars whose words are all in allow_words, are approved.
+    decide() returns None for anything else, which is escalated. With allow=False, decide() never approves,
+    so only the deny tier applies.
+    """
+
+    def __init__(
+        self,
+        allow_words: Iterable[str] = (),
+        deny_patterns: Iterable[str] = (),
+        allow_texts: Iterable[str] = (),
+        deny_texts: Iterable[str] = (),
+        max_allow_chars: int = 200,
+    ):
+        self.allow_words = frozenset(word.lower() for word in allow_words)
+        self.deny_patterns = [re.compile(pattern) for pattern in deny_patterns]
+        self.allow_hashes = {_text_hash(text) for text in allow_texts}
+        self.deny_hashes = {_text_hash(text) for text in deny_texts}
+        self.max_allow_chars = max_allow_chars
+
+    def decide(self, content: str, allow: bool = True) -> Optional[PreFilterVerdict]:
+        normalized = normalize_text(content)
+        digest = hashlib.sha256(normalized.encode("utf8")).hexdigest()
+        if digest in self.deny_hashes:
+            return PreFilterVerdict(True, content, "deny_list")
+        lowered = " ".join(content.lower().split())
+        for pattern in self.deny_patterns:
+            if pattern.search(lowered):
+                return PreFilterVerdict(True, content, "deny_pattern")
+        if not allow:
+            return None
+        if digest in self.allow_hashes:
+            return PreFilterVerdict(False, content, "allow_list")
+        if (
+            normalized
+            and len(content) <= self.max_allow_chars
+            and all(word in self.allow_words for word in normalized.split())
+        ):
+            return PreFilterVerdict(False, content, "allow_words")
+        return None
+
+
+def read_text_list(path: Optional[str]) -> List[str]:
+    """The non-empty lines of a text file, or nothing if path is not set"""
+    if not path:
+        return []
+    with open(path, "r", encoding="utf8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+class _TierCounter:
+    __slots__ = ("count", "total_ms")
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+
+
+class TieredGuard:
+    """
+    A scan that asks the pre-filter first and only runs the full scan for the texts it cannot decide.
+
+    Each tier counts the texts it decided and the time it spent on them, so stats() shows which share of
+    texts reached the expensive tier. With allow=False the pre-filter can only block, and every text it
+    does not block is scanned in full.
+    """
+
+    def __init__(self, prefilter: GuardPreFilter, scan: Scan, allow: bool = True):
+        self.prefilter = prefilter
+        self.full_scan = scan
+        self.allow = allow
+        self._tiers = {"prefilter": _TierCounter(), "full": _TierCounter()}
+        self.allowed = 0
+        self.denied = 0
+
+    async def scan(self, content: str):
+        start = time.perf_counter()
+        verdict = self.prefilter.decide(content, allow=self.allow)
+        prefilter_ms = (time.perf_counter() - start) * 1000
+        if verdict is not None:
+            self._count("prefilter", prefilter_ms)
+            if verdict.flagged:
+                self.denied += 1
+            else:
+                self.allowed += 1
+            return verdict
+        start = time.perf_counter()
+        result = await self.full_scan(content)
+        # The pre-filter time of escalated texts is part of what they cost
+        self._count("full", prefilter_ms + (time.perf_counter() - start) * 1000)
+        return result
+
+    def _count(self, tier: str, ms: float):
+        counter = self._tiers[tier]
+        counter.count += 1
+        counter.total_ms += ms
+
+    def stats(self) -> Dict[str, Any]:
+        total = sum(counter.count for counter in self._tiers.values())
+        stats: Dict[str, Any] = {
+            tier: {
+                "texts": counter.count,
+                "share": counter.count / total if total else 0.0,
+                "mean_ms": counter.total_ms / counter.count if counter.count else 0.0,
+            }
+            for tier, counter in self._tiers.items()
+        }
+        stats["prefilter"]["allowed"] = self.allowed
+        stats["prefilter"]["denied"] = self.denied
+        return stats
+
+
+def dome_fingerprint(dome_config_path: Optional[str] = None) -> str:
+    """Identifies the Dome version and configuration, so cached verdicts are not reused across them"""
+    try:
+        version = metadata.version("vijil-dome")
+    except metadata.PackageNotFoundError:
+        version = "unknown"
+    config = b"default"
+    if dome_config_path is not None:
+        path = Path(dome_config_path)
+        config = path.read_bytes() if path.is_file() else dome_config_path.encode("utf8")
+    return hashlib.sha256(version.encode("utf8") + b"\0" + config).hexdigest()[:16]
+
+
+class _Verdict:
+    __slots__ = ("result", "scan_ms", "cached_at")
+
+    def __init__(self, result, scan_ms: float, cached_at: float):
+        self.result = result
+        self.scan_ms = scan_ms
+        self.cached_at = cached_at
+
+
+class GuardVerdictCache:
+    """
+    Bounded LRU of Dome scan results keyed by a hash of the scanned text, the guard (input or output) and
+    the Dome fingerprint. Entries older than ttl seconds, if set, are scanned again. saved_ms adds up the
+    scan time of every hit, measured when the verdict was first computed, to help size the cache.
+    """
+
+    def __init__(
+        self, fingerprint: str, max_entries: int = 4096, ttl: Optional[float] = None
+    ):
+        self.fingerprint = fingerprint
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.saved_ms = 0.0
+        self._entries: "OrderedDict[str, _Verdict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _key(self, guard: str, content: str) -> str:
+        return hashlib.sha256(
+            f"{self.fingerprint}\0{guard}\0{content}".encode("utf8")
+        ).hexdigest()
+
+    def _get(self, key: str):
+        now = time.monotonic()
+        with self._lock:
+            verdict = self._entries.get(key)
+            if verdict is not None and (
+                self.ttl is None or now - verdict.cached_at < self.ttl
+            ):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                self.saved_ms += verdict.scan_ms
+                return verdict
+            self.misses += 1
+            return None
+
+    def _put(self, key: str, result, scan_ms: float):
+        with self._lock:
+            self._entries[key] = _Verdict(result, scan_ms, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    async def ascan(self, guard: str, content: str, scan: Scan):
+        """The cached verdict of guard for content, or the result of scan(content), which is then cached"""
+        key = self._key(guard, content)
+        verdict = self._get(key)
+        if verdict is not None:
+            return verdict.result
+        start = time.perf_counter()
+        result = await scan(content)
+        self._put(key, result, (time.perf_counter() - start) * 1000)
+        return result
+
+    def wrap(self, guard: str, scan: Scan) -> Scan:
+        """A scan function that goes through the cache"""
+        return lambda content: self.ascan(guard, content, scan)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "saved_ms": self.saved_ms,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+            }
+
+
+_shared_caches: Dict[Hashable, GuardVerdictCache] = {}
+_shared_caches_lock = threading.Lock()
+
+
+def shared_guard_cache(
+    fingerprint: str, max_entries: int = 4096, ttl: Optional[float] = None
+) -> GuardVerdictCache:
+    """Process-wide cache for the given settings, so every graph with the same Dome shares its verdicts"""
+    key = (fingerprint, max_entries, ttl)
+    with _shared_caches_lock:
+        if key not in _shared_caches:
+            _shared_caches[key] = GuardVerdictCache(fingerprint, max_entries, ttl)
+        return _shared_caches[key]
+
+
+def _content_hash(content: Any) -> str:
+    return hashlib.sha256(str(content).encode("utf8")).hexdigest()
+
+
+class ScannedMessages:
+    """
+    Messages already scanned and approved, per conversation thread, so each turn only scans new messages.
+
+    A message is remembered by its id together with a hash of its content, so a message that comes back
+    with the same id but different content is scanned again. Messages without an id are always scanned.
+    Only the max_threads most recently used threads are kept.
+    """
+
+    def __init__(self, max_threads: int = 10000):
+        self.max_threads = max_threads
+        self.scanned = 0
+        self.skipped = 0
+        self._threads: "OrderedDict[str, Dict[str, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def unscanned(self, thread_id: str, messages: List[Any]) -> List[Any]:
+        """The messages of a thread that have not been approved yet"""
+        with self._lock:
+            approved = self._threads.get(thread_id, {})
+            if thread_id in self._threads:
+                self._threads.move_to_end(thread_id)
+            new = [
+                message
+                for message in messages
+                if message.id is None
+                or approved.get(message.id) != _content_hash(message.content)
+            ]
+            self.scanned += len(new)
+            self.skipped += len(messages) - len(new)
+            return new
+
+    def approve(self, thread_id: str, messages: List[Any]):
+        with self._lock:
+            approved = self._threads.setdefault(thread_id, {})
+            self._threads.move_to_end(thread_id)
+            for message in messages:
+                if message.id is not None:
+                    approved[message.id] = _content_hash(message.content)
+            while len(self._threads) > self.max_threads:
+                self._threads.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "threads": len(self._threads),
+                "scanned": self.scanned,
+                "skipped": self.skipped,
+            }
+
+
+class SpeculationStats:
+    """Model calls started while the input guard was still scanning, and how many of them were thrown away"""
+
+    def __init__(self):
+        self.started = 0
+        self.used = 0
+        self.discarded = 0
+        # Discarded after the model had already answered, so every token of the call was spent
+        self.discarded_completed = 0
+
+    def discard(self, call: asyncio.Future):
+        self.discarded += 1
+        if call.done() and not call.cancelled():
+            if call.exception() is None:
+                self.discarded_completed += 1
+        else:
+            call.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "started": self.started,
+            "used": self.used,
+            "discarded": self.discarded,
+            "discarded_completed": self.discarded_completed,
+            "discard_rate": self.discarded / self.started if self.started else 0.0,
+        }
@@ -0,0 +1,168 @@
+import threading
+import time
+import warnings
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from kaito import KaitoClient
+
+_EMPTY_DATES = np.array([], dtype="datetime64[D]")
+_EMPTY_VALUES = np.array([], dtype=np.float64)
+
+
+def _today() -> np.datetime64:
+    return np.datetime64(datetime.now().strftime("%Y-%m-%d"), "D")
+
+
+def _contiguous_ranges(days: np.ndarray) -> List[Tuple[np.datetime64, np.datetime64]]:
+    """Split sorted days into (first, last) runs of consecutive days"""
+    if days.size == 0:
+        return []
+    breaks = np.flatnonzero(np.diff(days).astype(np.int64) != 1) + 1
+    return [(run[0], run[-1]) for run in np.split(days, breaks)]
+
+
+class MindshareHistory:
+    """
+    Incremental store of daily Kaito mindshare per token, held as sorted NumPy arrays of dates and values.
+
+    update() only asks Kaito for the days that are missing for each token, with one range request per
+    contiguous gap, and runs those requests concurrently through the KaitoClient pool. Closed days are
+    fetched once; the current day is refreshed after current_day_ttl seconds. trend_stats() aligns all
+    tokens on a common date axis and computes deltas, moving averages and z-scores with array math.
+    """
+
+    def __init__(self, client: KaitoClient, current_day_ttl: float = 3600.0):
+        self.client = client
+        self.current_day_ttl = current_day_ttl
+        self._dates: Dict[str, np.ndarray] = {}
+        self._values: Dict[str, np.ndarray] = {}
+        # Closed days that have been requested, including days Kaito had no data for
+        self._covered: Dict[str, np.ndarray] = {}
+        self._today_fetched_at: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def series(self, token: str) -> Tuple[np.ndarray, np.ndarray]:
+        """The (dates, values) arrays held for a token, sorted by date"""
+        with self._lock:
+            return (
+                self._dates.get(token, _EMPTY_DATES),
+                self._values.get(token, _EMPTY_VALUES),
+            )
+
+    def missing_ranges(self, token: str, days: int) -> List[Tuple[str, str]]:
+        """Date ranges of the last `days` days (ending today) that still have to be fetched for a token"""
+        today = _today()
+        window = np.arange(today - (days - 1), today + 1)
+        with self._lock:
+            covered = self._covered.get(token, _EMPTY_DATES)
+            today_fetched_at = self._today_fetched_at.get(token)
+        missing = np.setdiff1d(window, covered, assume_unique=True)
+        if (
+            today_fetched_at is not None
+            and time.time() - today_fetched_at < self.current_day_ttl
+        ):
+            missing = missing[missing != today]
+        return [(str(first), str(last)) for first, last in _contiguous_ranges(missing)]
+
+    def _merge(self, token: str, start: str, end: str, series: Dict[str, float]):
+        dates = np.array([key[:10] for key in series], dtype="datetime64[D]")
+        values = np.array(list(series.values()), dtype=np.float64)
+        today = _today()
+        requested = np.arange(np.datetime64(start, "D"), np.datetime64(end, "D") + 1)
+        with self._lock:
+            # New values first so np.unique keeps them over older ones for the same day
+            all_dates = np.concatenate([dates, self._dates.get(token, _EMPTY_DATES)])
+            all_values = np.concatenate([values, self._values.get(token, _EMPTY_VALUES)])
+            unique_dates, first = np.unique(all_dates, return_index=True)
+            self._dates[token] = unique_dates
+            self._values[token] = all_values[first]
+            self._covered[token] = np.union1d(
+                self._covered.get(token, _EMPTY_DATES), requested[requested < today]
+            )
+            if requested[-1] >= today:
+                self._today_fetched_at[token] = time.time()
+
+    def _plan(self, tokens: List[str], days: int) -> List[Tuple[str, str, str]]:
+        return [
+            (token, start, end)
+            for token in tokens
+            for start, end in self.missing_ranges(token, days)
+        ]
+
+    def _apply(self, ranges: List[Tuple[str, str, str]], results) -> Dict[str, str]:
+        errors = {}
+        for (token, start, end), result in zip(ranges, results):
+            if isinstance(result, Exception):
+                print(f"Error getting mindshare history for {token}: {str(result)}")
+                errors[token] = str(result)
+            else:
+                self._merge(token, start, end, result)
+        return errors
+
+    def update(self, tokens: List[str], days: int = 30) -> Dict[str, str]:
+        """Fetch the missing days of the last `days` days for every token. Returns errors by token"""
+        ranges = self._plan(tokens, days)
+        if not ranges:
+            return {}
+        return self._apply(ranges, self.client.get_series_many(ranges))
+
+    async def aupdate(self, tokens: List[str], days: int = 30) -> Dict[str, str]:
+        """Async version of update"""
+        ranges = self._plan(tokens, days)
+        if not ranges:
+            return {}
+        return self._apply(ranges, await self.client.aget_series_many(ranges))
+
+    def matrix(self, tokens: List[str], days: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Values of the last `days` days as a (tokens x days) array, NaN where a day has no data"""
+        axis = np.arange(_today() - (days - 1), _today() + 1)
+        matrix = np.full((len(tokens), days), np.nan)
+        for row, token in enumerate(tokens):
+            dates, values = self.series(token)
+            index = np.searchsorted(axis, dates)
+            in_window = (index < days) & (axis[np.minimum(index, days - 1)] == dates)
+            matrix[row, index[in_window]] = values[in_window]
+        return axis, matrix
+
+    def trend_stats(
+        self, tokens: List[str], days: int = 30, window: int = 7
+    ) -> Dict[str, Dict[str, Optional[float]]]:
+        """
+        Per-token trend statistics over the last `days` days: the latest value, its change from the day before
+        (None if that day has no data), the `window`-day moving average and the z-score of the latest value against the period.
+        """
+        if not tokens:
+            return {}
+        _, matrix = self.matrix(tokens, days)
+        valid = ~np.isnan(matrix)
+        rows = np.arange(len(tokens))
+        counts = valid.sum(axis=1)
+
+        # Column of the last observation in each row and of the day before it
+        last_col = days - 1 - np.argmax(valid[:, ::-1], axis=1)
+        prev_col = np.maximum(last_col - 1, 0)
+
+        with warnings.catch_warnings(), np.errstate(invalid="ignore", divide="ignore"):
+            warnings.simplefilter("ignore", category=RuntimeWarning)
+            latest = np.where(counts > 0, matrix[rows, last_col], np.nan)
+            previous = np.where(last_col > 0, matrix[rows, prev_col], np.nan)
+            moving_average = np.nanmean(matrix[:, -window:], axis=1)
+            mean = np.nanmean(matrix, axis=1)
+            std = np.nanstd(matrix, axis=1)
+            zscore = np.where(std > 0, (latest - mean) / std, np.nan)
+
+        def value(array, row):
+            return None if np.isnan(array[row]) else float(array[row])
+
+        return {
+            token: {
+                "latest": value(latest, row),
+                "delta": value(latest - previous, row),
+                "moving_average": value(moving_average, row),
+                "zscore": value(zscore, row),
+                "days_with_data": int(counts[row]),
+            }
+            for row, token in enumerate(tokens)
+        }
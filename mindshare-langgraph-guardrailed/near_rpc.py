@@ -0,0 +1,187 @@
+import asyncio
+import base64
+import contextlib
+import json
+from typing import Any, Dict, Optional
+
+import httpx
+import near_api
+from rpc_pool import RpcEndpointPool
+
+
+class NearRpcError(Exception):
+    """Raised when the NEAR JSON-RPC endpoint answers with an error payload"""
+
+
+async def aclose_client(client: httpx.AsyncClient, loop: Optional[asyncio.AbstractEventLoop]):
+    """Close an httpx client whose connections belong to loop, from whichever loop is running now"""
+    if loop is not None and loop.is_running() and loop is not asyncio.get_running_loop():
+        # The loop that owns the connections is still running in another thread, so close them there
+        asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+        return
+    # A closed loop cannot release its transports; the client is still marked closed, so it is not reused
+    with contextlib.suppress(RuntimeError):
+        await client.aclose()
+
+
+class AsyncNearRpcClient:
+    """
+    Asyncio-native NEAR JSON-RPC client for read-only view calls.
+
+    Requests share a pool of keep-alive HTTP connections, the number of calls in flight is capped
+    by max_concurrency, and every call is bounded by a per-call timeout. view_function returns the
+    same shape as near_api.account.Account.view_function so it can be used as a drop-in replacement.
+    If an RpcEndpointPool is given, requests go through the pool instead of the single rpc_url.
+    """
+
+    def __init__(
+        self,
+        rpc_url: Optional[str] = None,
+        pool: Optional[RpcEndpointPool] = None,
+        max_concurrency: int = 16,
+        max_connections: int = 32,
+        max_keepalive_connections: int = 16,
+        timeout: float = 10.0,
+    ):
+        if rpc_url is None and pool is None:
+            raise ValueError("Either rpc_url or pool is required")
+        self.rpc_url = rpc_url
+        self.pool = pool
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+        )
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def _ensure_client(self) -> httpx.AsyncClient:
+        # Connection pools and semaphores are bound to the event loop that first uses them, so
+        # start a fresh pool if we are called from a different loop (e.g. repeated asyncio.run)
+        loop = asyncio.get_running_loop()
+        client = self._client
+        if client is None or self._loop is not loop:
+            old_client, old_loop = self._client, self._loop
+            client = self._client = httpx.AsyncClient(
+                limits=self._limits, timeout=self.timeout
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._loop = loop
+            # The old pool's connections would otherwise stay open until garbage collected
+            if old_client is not None:
+                await aclose_client(old_client, old_loop)
+        return client
+
+    async def _post(
+        self, rpc_url: str, payload: Dict[str, Any], timeout: Optional[float]
+    ) -> Dict[str, Any]:
+        client = await self._ensure_client()
+        async with self._semaphore:
+            response = await client.post(
+                rpc_url,
+                json=payload,
+                timeout=timeout if timeout is not None else self.timeout,
+            )
+        response.raise_for_status()
+        content = response.json()
+        if "error" in content:
+            raise NearRpcError(content["error"])
+        return content["result"]
+
+    async def json_rpc(
+        self, method: str, params: Any, timeout: Optional[float] = None
+    ) -> Dict[str, Any]:
+        payload = {"method": method, "params": params, "id": "dontcare", "jsonrpc": "2.0"}
+        if self.pool is None:
+            return await self._post(self.rpc_url, payload, timeout)
+        status = {"method": "status", "params": [], "id": "dontcare", "jsonrpc": "2.0"}
+        self.pool.amaybe_check_health(lambda url: self._post(url, status, timeout))
+        return await self.pool.acall(lambda url: self._post(url, payload, timeout))
+
+    async def check_health(self, timeout: Optional[float] = None):
+        """Probe every pooled endpoint with a status request to refresh its latency and health"""
+        if self.pool is None:
+            return
+        payload = {"method": "status", "params": [], "id": "dontcare", "jsonrpc": "2.0"}
+        await self.pool.acheck_health(lambda url: self._post(url, payload, timeout))
+
+    async def view_call(
+        self,
+        contract_id: str,
+        method_name: str,
+        args: bytes,
+        finality: str = "optimistic",
+        timeout: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        return await self.json_rpc(
+            "query",
+            {
+                "request_type": "call_function",
+                "account_id": contract_id,
+                "method_name": method_name,
+                "args_base64": base64.b64encode(args).decode("utf8"),
+                "finality": finality,
+            },
+            timeout=timeout,
+        )
+
+    async def view_function(
+        self,
+        contract_id: str,
+        method_name: str,
+        args: Optional[dict] = None,
+        timeout: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        """Call a contract view method and decode its JSON result"""
+        result = await self.view_call(
+            contract_id,
+            method_name,
+            json.dumps(args or {}).encode("utf8"),
+            timeout=timeout,
+        )
+        if "result" in result:
+            result["result"] = json.loads(bytes(result["result"]).decode("utf8"))
+        return result
+
+    async def aclose(self):
+        if self._client is not None:
+            client, loop = self._client, self._loop
+            self._client = None
+            self._loop = None
+            await aclose_client(client, loop)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+
+class ReadOnlyAccount:
+    """
+    The part of near_api.account.Account used for balance lookups, for accounts we hold no key for.
+
+    Unlike Account it needs no signer and makes no RPC calls when it is created, so one can be made per
+    request for any account id.
+    """
+
+    def __init__(self, provider: near_api.providers.JsonProvider, account_id: str):
+        self._provider = provider
+        self.account_id = account_id
+
+    @property
+    def provider(self) -> near_api.providers.JsonProvider:
+        return self._provider
+
+    def view_function(
+        self, contract_id: str, method_name: str, args: Optional[dict] = None
+    ) -> dict:
+        result = self._provider.view_call(
+            contract_id, method_name, json.dumps(args).encode("utf8")
+        )
+        if "error" in result:
+            raise near_api.account.ViewFunctionError(result["error"])
+        result["result"] = json.loads(bytes(result["result"]).decode("utf8"))
+        return result
@@ -0,0 +1,147 @@
+import asyncio
+import hashlib
+import time
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from setup import AgentSetup
+
+
+def prompt_prefix_hash(prefix: str) -> str:
+    return hashlib.sha256(prefix.encode("utf8")).hexdigest()[:16]
+
+
+class PortfolioContext(NamedTuple):
+    """Prompts built from one read of the balances and mindshare. Immutable, so it can be shared freely"""
+
+    system_prompt: str
+    mindshare_prompts: List[str]
+    version: int
+    built_at: float
+    build_ms: float
+    # Static instructions sent ahead of system_prompt in the stable-prefix layout, otherwise None
+    prefix: Optional[str]
+    # Hash of the first message sent to the model, which is the part a provider prompt cache can reuse
+    prefix_hash: str
+
+
+class PortfolioContextRefresher:
+    """
+    Keeps the portfolio part of the agent prompts fresh without rebuilding the graph.
+
+    With an interval set, a background asyncio task rebuilds the prompts every `interval` seconds and replaces the current
+    PortfolioContext in a single assignment. A request that reads `current` once keeps that snapshot for
+    its whole run, even if a refresh lands meanwhile. A failed refresh keeps the previous context. The
+    prompt build deadline (prompt_kwargs["deadline"]) bounds how long a refresh may take.
+    """
+
+    def __init__(
+        self,
+        agent_setup: AgentSetup,
+        interval: Optional[float] = None,
+        **prompt_kwargs,
+    ):
+        self.agent_setup = agent_setup
+        self.interval = interval
+        self.prompt_kwargs = prompt_kwargs
+        self.refreshes = 0
+        self.failures = 0
+        self.last_refresh_ms: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self._current: Optional[PortfolioContext] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def current(self) -> Optional[PortfolioContext]:
+        return self._current
+
+    def build(self) -> PortfolioContext:
+        """Build a context synchronously and make it current, for the first build before any loop runs"""
+        start = time.perf_counter()
+        system_prompt, mindshare_prompts = self.agent_setup.create_agent_prompts(
+            **self.prompt_kwargs
+        )
+        return self._swap(system_prompt, mindshare_prompts, start)
+
+    async def refresh(self) -> PortfolioContext:
+        start = time.perf_counter()
+        system_prompt, mindshare_prompts = await self.agent_setup.acreate_agent_prompts(
+            **self.prompt_kwargs
+        )
+        return self._swap(system_prompt, mindshare_prompts, start)
+
+    def _swap(
+        self, system_prompt: str, mindshare_prompts: List[str], start: float
+    ) -> PortfolioContext:
+        build_ms = (time.perf_counter() - start) * 1000
+        version = self._current.version + 1 if self._current is not None else 1
+        prefix = (
+            self.agent_setup.format_prompt_prefix(
+                compact=self.prompt_kwargs.get("compact_context", False)
+            )
+            if self.prompt_kwargs.get("stable_prefix")
+            else None
+        )
+        context = PortfolioContext(
+            system_prompt,
+            list(mindshare_prompts),
+            version,
+            time.time(),
+            build_ms,
+            prefix,
+            prompt_prefix_hash(prefix if prefix is not None else system_prompt),
+        )
+        self._current = context
+        self.refreshes += 1
+        self.last_refresh_ms = build_ms
+        return context
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                context = await self.refresh()
+                print(
+                    f"Portfolio context refreshed to version {context.version} in {context.build_ms:.1f}ms"
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failures += 1
+                self.last_error = str(e)
+                print(f"Error refreshing portfolio context: {str(e)}")
+
+    def ensure_started(self):
+        """Start the refresh task on the running event loop, unless it is already running there"""
+        if not self.interval:
+            return
+        loop = asyncio.get_running_loop()
+        if (
+            self._task is not None
+            and not self._task.done()
+            and self._task.get_loop() is loop
+        ):
+            return
+        # A task left on another loop stops with that loop
+        self._task = loop.create_task(self._run())
+
+    def stop(self):
+        """Cancel the refresh task. Safe to call from any thread"""
+        task, self._task = self._task, None
+        if task is not None and not task.done():
+            loop = task.get_loop()
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(task.cancel)
+
+    def stats(self) -> Dict[str, Any]:
+        context = self._current
+        return {
+            "interval": self.interval,
+            "version": context.version if context is not None else 0,
+            "prefix_hash": context.prefix_hash if context is not None else None,
+            "age": time.time() - context.built_at if context is not None else None,
+            "refreshes": self.refreshes,
+            "failures": self.failures,
+            "last_refresh_ms": self.last_refresh_ms,
+            "last_error": self.last_error,
+            "running": self._task is not None and not self._task.done(),
+        }
@@ -1,16 +1,28 @@
+import asyncio
+import copy
 import near_api
-import requests
 from pathlib import Path
 from constants import (
     ASSET_MAP,
+    BALANCES_UNAVAILABLE,
     MOCK_BALANCES,
     MOCK_MINDSHARES,
     NEAR_COIN_NAME,
     TIMEOUT_LIMIT,
+    DEADLINE_EXCEEDED_ERROR,
+    PORTFOLIO_SECTION_REFERENCE,
+    TREND_AVERAGE_DAYS,
 )
+from balance_cache import BalanceCache
+from deadline import DeadlineBudget
 from decimal import Decimal
-from typing import Optional, Tuple, List
-from datetime import datetime, timedelta
+from kaito import KaitoClient
+from mindshare_cache import MindshareCache
+from mindshare_history import MindshareHistory
+from near_rpc import AsyncNearRpcClient, NearRpcError, ReadOnlyAccount
+from rpc_pool import RpcEndpointPool, PooledJsonProvider, is_deterministic_rpc_error
+from singleflight import BALANCE_FLIGHTS, MINDSHARE_FLIGHTS
+from typing import Optional, Tuple, List, Dict
 
 
 def get_asset_id(token_name: str):
@@ -34,26 +46,185 @@ class AgentSetup:
         private_key: Optional[str],
         network: Optional[str],
         kaito_api_key: Optional[str] = None,
+        batch_balances: bool = True,
+        rpc_client: Optional[AsyncNearRpcClient] = None,
+        rpc_endpoints: Optional[List[str]] = None,
+        hedge_rpc_requests: bool = False,
+        rpc_hedge_delay: Optional[float] = None,
+        balance_cache: Optional[BalanceCache] = None,
+        kaito_max_concurrency: int = 8,
+        mindshare_cache: Optional[MindshareCache] = None,
     ):
+        self.network = network
+        # rpc_endpoints serve this setup's network; other networks of for_account use their public RPC
+        self.rpc_endpoints = list(rpc_endpoints or [])
+        self.hedge_rpc_requests = hedge_rpc_requests
+        self.rpc_hedge_delay = rpc_hedge_delay
+        # RPC providers, async clients and endpoint pools per network, shared with setups made by for_account
+        self._network_clients: Dict[
+            str,
+            Tuple[
+                near_api.providers.JsonProvider,
+                AsyncNearRpcClient,
+                Optional[RpcEndpointPool],
+            ],
+        ] = {}
+        # Balances are view calls, so the RPC clients are built even without a private key
+        if network is not None:
+            near_provider, default_rpc_client, self.rpc_pool = self._network_rpc(network)
+            # Non-blocking client for the async code paths (aget_balances, acreate_agent_prompts)
+            self.rpc_client = rpc_client or default_rpc_client
+        else:
+            self.rpc_pool = None
+            self.rpc_client = rpc_client
+
         if any(var is None for var in (account_id, private_key, network)):
             print(
                 "Account, Provider, or private key is None. Agent will not use a near account."
             )
             self.account = None
         else:
-            provider = get_provider(network)
-            near_provider = near_api.providers.JsonProvider(provider)
             key_pair = near_api.signer.KeyPair(private_key)
             signer = near_api.signer.Signer(account_id, key_pair)
             self.account = near_api.account.Account(near_provider, signer, account_id)
 
         self.kaito_api_key = kaito_api_key
+        self.kaito_client = (
+            KaitoClient(
+                kaito_api_key,
+                max_concurrency=kaito_max_concurrency,
+                timeout=TIMEOUT_LIMIT,
+                cache=mindshare_cache,
+                flights=MINDSHARE_FLIGHTS,
+            )
+            if kaito_api_key is not None
+            else None
+        )
+        self.mindshare_history = (
+            MindshareHistory(self.kaito_client)
+            if self.kaito_client is not None
+            else None
+        )
+        self.batch_balances = batch_balances
+        self.balance_cache = balance_cache
+
+        # Fallbacks for lookups that miss the prompt deadline, and timings of the last prompt build
+        self._last_known_balances: Optional[Dict[str, float]] = None
+        self._last_known_mindshares: Dict[str, dict] = {}
+        self.last_prompt_timings: Dict[str, object] = {}
+        # Setups made with for_account share this setup's clients, so only this one closes them
+        self._owns_clients = True
+
+    def for_account(self, account_id: str, network: Optional[str] = None) -> "AgentSetup":
+        """
+        Read-only setup for another account that shares this setup's Kaito client, caches and RPC
+        clients. Balances are view calls, so no private key is needed and nothing is fetched here.
+        """
+        network = network or self.network or "mainnet"
+        tenant = copy.copy(self)
+        provider, rpc_client, tenant.rpc_pool = self._network_rpc(network)
+        if network == self.network and self.rpc_client is not None:
+            rpc_client = self.rpc_client
+        tenant.account = ReadOnlyAccount(provider, account_id)
+        tenant.rpc_client = rpc_client
+        tenant.network = network
+        tenant._last_known_balances = None
+        tenant._last_known_mindshares = {}
+        tenant.last_prompt_timings = {}
+        tenant._owns_clients = False
+        return tenant
+
+    def _network_rpc(
+        self, network: str
+    ) -> Tuple[
+        near_api.providers.JsonProvider, AsyncNearRpcClient, Optional[RpcEndpointPool]
+    ]:
+        """The sync provider, async client and endpoint pool for a network, built once per network"""
+        if network not in self._network_clients:
+            rpc_url = get_provider(network)
+            if self.rpc_endpoints and network == self.network:
+                # Spread requests over several RPC endpoints with latency-aware selection and failover
+                pool = RpcEndpointPool(
+                    self.rpc_endpoints,
+                    hedge=self.hedge_rpc_requests,
+                    hedge_delay=self.rpc_hedge_delay,
+                    # Only contract and request errors are returned as is; node errors fail over
+                    passthrough=lambda error: isinstance(
+                        error, (near_api.providers.JsonProviderError, NearRpcError)
+                    )
+                    and is_deterministic_rpc_error(error),
+                )
+                provider = PooledJsonProvider(pool)
+            else:
+                pool = None
+                provider = near_api.providers.JsonProvider(rpc_url)
+            self._network_clients[network] = (
+                provider,
+                AsyncNearRpcClient(rpc_url, pool=pool),
+                pool,
+            )
+        return self._network_clients[network]
+
+    def close(self):
+        """Release the Kaito client's connections and threads. Setups made with for_account leave them open"""
+        if self._owns_clients and self.kaito_client is not None:
+            self.kaito_client.close()
+
+    def get_rpc_stats(self) -> Dict[str, dict]:
+        """Per-endpoint latency and error counters, empty unless rpc_endpoints were given"""
+        if self.rpc_pool is None:
+            return {}
+        return self.rpc_pool.stats()
+
+    def get_singleflight_stats(self) -> Dict[str, dict]:
+        """How many balance and mindshare lookups ran upstream and how many duplicates were coalesced"""
+        return {
+            "balances": BALANCE_FLIGHTS.stats(),
+            "mindshare": MINDSHARE_FLIGHTS.stats(),
+        }
+
+    def _parse_balance(self, balances: Dict[str, float], token: str, balance_str):
+        """Convert a raw intents.near balance string and store it under the token name"""
+        if balance_str:
+            balance = Decimal(balance_str) / Decimal(
+                str(10 ** ASSET_MAP[token]["decimals"])
+            )
+            if balance > 0:
+                balances[token] = float(balance)
+            else:
+                balances[token] = 0
+
+    def _batch_balance_args(self, tokens: List[str]):
+        return {
+            "account_id": self.account.account_id,
+            "token_ids": [get_asset_id(token) for token in tokens],
+        }
+
+    def _parse_batch_balances(self, tokens: List[str], result):
+        if not isinstance(result, dict) or not isinstance(result.get("result"), list):
+            raise ValueError(f"Unexpected mt_batch_balance_of response: {result}")
+        if len(result["result"]) != len(tokens):
+            raise ValueError(
+                f"mt_batch_balance_of returned {len(result['result'])} balances for {len(tokens)} tokens"
+            )
+
+        balances = {}
+        for token, balance_str in zip(tokens, result["result"]):
+            self._parse_balance(balances, token, balance_str)
+        return balances
+
+    def _get_near_account_balances_batched(self, tokens: List[str]):
+        """Get the given assets for an account with a single mt_batch_balance_of view call"""
+        result = self.account.view_function(
+            "intents.near", "mt_batch_balance_of", self._batch_balance_args(tokens)
+        )
+        return self._parse_batch_balances(tokens, result)
 
-    def _get_near_account_balances(self):
-        """Get all assets for an account in intents.near contract"""
+    def _get_near_account_balances_per_token(self, tokens: List[str]):
+        """Get the given assets for an account with one mt_balance_of view call per token"""
         balances = {}
 
-        for token, info in ASSET_MAP.items():
+        for token in tokens:
             try:
                 result = self.account.view_function(
                     "intents.near",
@@ -65,15 +236,7 @@ class AgentSetup:
                 )
 
                 if isinstance(result, dict) and "result" in result:
-                    balance_str = result["result"]
-                    if balance_str:
-                        balance = Decimal(balance_str) / Decimal(
-                            str(10 ** info["decimals"])
-                        )
-                        if balance > 0:
-                            balances[token] = float(balance)
-                        else:
-                            balances[token] = 0
+                    self._parse_balance(balances, token, result["result"])
 
             except Exception as e:
                 print(f"Error getting balance for {token}: {str(e)}")
@@ -81,10 +244,123 @@ class AgentSetup:
 
         return balances
 
+    def _get_near_account_balances(self, tokens: List[str]):
+        """Get assets for an account in intents.near contract"""
+        if self.batch_balances:
+            try:
+                return self._get_near_account_balances_batched(tokens)
+            except Exception as e:
+                print(
+                    f"Batched balance lookup failed, falling back to per-token calls: {str(e)}"
+                )
+        return self._get_near_account_balances_per_token(tokens)
+
+    async def _aget_near_account_balances(self, tokens: List[str]):
+        """Async version of _get_near_account_balances that does not block the event loop"""
+        if self.batch_balances:
+            try:
+                result = await self.rpc_client.view_function(
+                    "intents.near",
+                    "mt_batch_balance_of",
+                    self._batch_balance_args(tokens),
+                )
+                return self._parse_batch_balances(tokens, result)
+            except Exception as e:
+                print(
+                    f"Batched balance lookup failed, falling back to per-token calls: {str(e)}"
+                )
+
+        # Per-token calls run concurrently, bounded by the client's max_concurrency
+        results = await asyncio.gather(
+            *(
+                self.rpc_client.view_function(
+                    "intents.near",
+                    "mt_balance_of",
+                    {
+                        "account_id": self.account.account_id,
+                        "token_id": get_asset_id(token),
+                    },
+                )
+                for token in tokens
+            ),
+            return_exceptions=True,
+        )
+        balances = {}
+        for token, result in zip(tokens, results):
+            if isinstance(result, Exception):
+                print(f"Error getting balance for {token}: {str(result)}")
+            elif isinstance(result, dict) and "result" in result:
+                self._parse_balance(balances, token, result["result"])
+        return balances
+
+    def _balance_flight_key(self, tokens: List[str]):
+        return (self.network, self.account.account_id, tuple(tokens))
+
+    def _get_coalesced_balances(self, tokens: List[str]) -> Dict[str, float]:
+        """Share one upstream read between concurrent lookups of the same account and tokens"""
+        balances = BALANCE_FLIGHTS.do(
+            self._balance_flight_key(tokens),
+            lambda: self._get_near_account_balances(tokens),
+        )
+        return dict(balances)
+
+    async def _aget_coalesced_balances(self, tokens: List[str]) -> Dict[str, float]:
+        balances = await BALANCE_FLIGHTS.ado(
+            self._balance_flight_key(tokens),
+            lambda: self._aget_near_account_balances(tokens),
+        )
+        return dict(balances)
+
     def _mock_near_account_balances(self):
         "Mocked balances to test the agent without needing near balances"
         return MOCK_BALANCES
 
+    def _balance_cache_key(self, token: str):
+        return (self.network, self.account.account_id, get_asset_id(token))
+
+    def _cached_balances(self, block_height: Optional[int]) -> Dict[str, float]:
+        cached = self.balance_cache.get_many(
+            [self._balance_cache_key(token) for token in ASSET_MAP], block_height
+        )
+        return {
+            token: cached[self._balance_cache_key(token)]
+            for token in ASSET_MAP
+            if self._balance_cache_key(token) in cached
+        }
+
+    def _merge_cached_balances(
+        self,
+        cached: Dict[str, float],
+        fetched: Dict[str, float],
+        block_height: Optional[int],
+    ) -> Dict[str, float]:
+        self.balance_cache.put_many(
+            {self._balance_cache_key(token): value for token, value in fetched.items()},
+            block_height,
+        )
+        # Keep the ASSET_MAP order so prompts do not depend on what was cached
+        return {
+            token: cached[token] if token in cached else fetched[token]
+            for token in ASSET_MAP
+            if token in cached or token in fetched
+        }
+
+    def _get_final_block_height(self) -> Optional[int]:
+        try:
+            block = self.account.provider.json_rpc("block", {"finality": "final"})
+            return block["header"]["height"]
+        except Exception as e:
+            print(f"Error getting final block height: {str(e)}")
+            return None
+
+    async def _aget_final_block_height(self) -> Optional[int]:
+        try:
+            block = await self.rpc_client.json_rpc("block", {"finality": "final"})
+            return block["header"]["height"]
+        except Exception as e:
+            print(f"Error getting final block height: {str(e)}")
+            return None
+
     def get_balances(self, mock=False):
         """Get balances for the account, either real or mocked"""
         if mock:
@@ -92,21 +368,38 @@ class AgentSetup:
         else:
             if self.account is None:
                 raise ValueError("Account is not set up. Cannot get balances.")
-            return self._get_near_account_balances()
+            if self.balance_cache is None:
+                return self._get_coalesced_balances(list(ASSET_MAP))
 
-    def _get_kaito_mindshare(self, token: str):
-        today = datetime.now().strftime("%Y-%m-%d")
-        yesterday = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
-        base_url = f"https://api.kaito.ai/api/v1/mindshare?token={token}&start_date={yesterday}&end_date={today}"
-        headers = {"x-api-key": self.kaito_api_key}
-        response = requests.get(base_url, headers=headers, timeout=TIMEOUT_LIMIT)
-        print(f"Kaito API response for {token}: {response.text}")  # Debug log
-        if response.status_code == 200:
-            data = response.json()
-            mindshare_value = list(data["mindshare"].values())[0]
-            return {"mindshare": mindshare_value}
+            # Only read the tokens that are missing or stale in the cache
+            block_height = None
+            if self.balance_cache.invalidate_on_new_block:
+                block_height = self._get_final_block_height()
+            cached = self._cached_balances(block_height)
+            missing = [token for token in ASSET_MAP if token not in cached]
+            fetched = self._get_coalesced_balances(missing) if missing else {}
+            return self._merge_cached_balances(cached, fetched, block_height)
+
+    async def aget_balances(self, mock=False):
+        """Async version of get_balances"""
+        if mock:
+            return self._mock_near_account_balances()
         else:
-            return {"error": "Failed to get mindshare"}
+            if self.account is None:
+                raise ValueError("Account is not set up. Cannot get balances.")
+            if self.balance_cache is None:
+                return await self._aget_coalesced_balances(list(ASSET_MAP))
+
+            block_height = None
+            if self.balance_cache.invalidate_on_new_block:
+                block_height = await self._aget_final_block_height()
+            cached = self._cached_balances(block_height)
+            missing = [token for token in ASSET_MAP if token not in cached]
+            fetched = await self._aget_coalesced_balances(missing) if missing else {}
+            return self._merge_cached_balances(cached, fetched, block_height)
+
+    def _get_kaito_mindshare(self, token: str):
+        return self.kaito_client.get_mindshare(token)
 
     def _get_mock_mindshare(self, token: str):
         result = MOCK_MINDSHARES.get(token, {"error": "Token not found"})
@@ -122,41 +415,171 @@ class AgentSetup:
                 )
             return self._get_kaito_mindshare(token)
 
+    def get_mindshares(
+        self, tokens: List[str], mock=False, timeout: Optional[float] = None
+    ) -> Dict[str, dict]:
+        """Get the mindshare of several tokens, fetching them from Kaito concurrently"""
+        if mock:
+            return {token: self._get_mock_mindshare(token) for token in tokens}
+        else:
+            if self.kaito_api_key is None:
+                raise ValueError(
+                    "Kaito API key is required for unmocked mindshare queries"
+                )
+            return self.kaito_client.get_mindshares(tokens, timeout=timeout)
+
+    async def aget_mindshare(self, token, mock=False):
+        """Async version of get_mindshare"""
+        if mock:
+            return self._get_mock_mindshare(token)
+        else:
+            if self.kaito_api_key is None:
+                raise ValueError(
+                    "Kaito API key is required for unmocked mindshare queries"
+                )
+            return await self.kaito_client.aget_mindshare(token)
+
+    async def aget_mindshares(
+        self, tokens: List[str], mock=False, timeout: Optional[float] = None
+    ) -> Dict[str, dict]:
+        """Async version of get_mindshares"""
+        if mock:
+            return {token: self._get_mock_mindshare(token) for token in tokens}
+        else:
+            if self.kaito_api_key is None:
+                raise ValueError(
+                    "Kaito API key is required for unmocked mindshare queries"
+                )
+            return await self.kaito_client.aget_mindshares(tokens, timeout=timeout)
+
+    def get_mindshare_trends(
+        self, tokens: List[str], days: int = 30, window: int = TREND_AVERAGE_DAYS
+    ) -> Dict[str, dict]:
+        """Mindshare trend statistics per token, fetching only the days missing from the history"""
+        if self.mindshare_history is None:
+            raise ValueError("Kaito API key is required for mindshare trends")
+        self.mindshare_history.update(tokens, days=days)
+        return self.mindshare_history.trend_stats(tokens, days=days, window=window)
+
+    async def aget_mindshare_trends(
+        self, tokens: List[str], days: int = 30, window: int = TREND_AVERAGE_DAYS
+    ) -> Dict[str, dict]:
+        """Async version of get_mindshare_trends"""
+        if self.mindshare_history is None:
+            raise ValueError("Kaito API key is required for mindshare trends")
+        await self.mindshare_history.aupdate(tokens, days=days)
+        return self.mindshare_history.trend_stats(tokens, days=days, window=window)
+
+    def _format_trend(self, token: str, trend: dict, days: int) -> Optional[str]:
+        if trend["latest"] is None:
+            return None
+
+        def fmt(value, spec):
+            return "n/a" if value is None else format(value, spec)
+
+        average_days = min(TREND_AVERAGE_DAYS, days)
+        return (
+            f"Mindshare trend for {token} over the last {days} days: "
+            f"change since previous day {fmt(trend['delta'], '+.4f')}, "
+            f"{average_days}-day average {fmt(trend['moving_average'], '.4f')}, "
+            f"z-score {fmt(trend['zscore'], '.2f')}"
+        )
+
     # Helper function, just to keep things clean
     def get_allowed_assets(self):
         return list(ASSET_MAP.keys())
 
-    def create_agent_prompts(
-        self,
-        mock_balances: bool = True,
-        mock_mindshare: bool = True,
-        use_single_prompt: bool = True,
-    ) -> Tuple[str, List[str]]:
-        # Get balances for the account
-        balances = self.get_balances(mock=mock_balances)
-        asset_keys = self.get_allowed_assets()
+    def _load_system_template(self) -> str:
+        return (Path(__file__).parent / "system_prompt.txt").read_text()
 
-        # Load the template from file
-        template_text = Path(__file__).parent / "system_prompt.txt"
-        template_text = template_text.read_text()
+    def _format_token_list(self, tokens: List[str], compact: bool) -> str:
+        return ", ".join(tokens) if compact else str(list(tokens))
 
-        # Fill in the placeholders
-        system_prompt = template_text.format(
-            asset_keys=asset_keys, balance_keys=list(balances.keys())
+    def format_prompt_prefix(self, compact: bool = False) -> str:
+        """
+        The instructions and allowed assets without any portfolio data. It only changes with the template or
+        ASSET_MAP, so LLM providers can reuse their prompt cache for it across requests.
+        """
+        return self._load_system_template().format(
+            asset_keys=self._format_token_list(self.get_allowed_assets(), compact),
+            balance_keys=PORTFOLIO_SECTION_REFERENCE,
         )
 
-        # Get the mindshare balances and create the additional prompts
+    def _format_compact_table(
+        self,
+        balances: Dict[str, float],
+        mindshares: Dict[str, dict],
+        trends: Optional[Dict[str, dict]],
+        trend_days: int,
+    ) -> str:
+        """One row per held token instead of one sentence per token, to keep the prompt short"""
+
+        def fmt(value, spec=""):
+            return "n/a" if value is None else format(value, spec)
+
+        columns = ["token", "balance", "mindshare"]
+        if trends:
+            average_days = min(TREND_AVERAGE_DAYS, trend_days)
+            columns += ["1d_delta", f"{average_days}d_avg", "zscore"]
+        rows = [f"Portfolio ({'|'.join(columns)}):"]
+        for token, amount in balances.items():
+            mindshare = mindshares[token]
+            cells = [token, fmt(amount), fmt(mindshare.get("mindshare"))]
+            if trends:
+                trend = trends.get(token) or {}
+                cells += [
+                    fmt(trend.get("delta"), "+.4f"),
+                    fmt(trend.get("moving_average"), ".4f"),
+                    fmt(trend.get("zscore"), ".2f"),
+                ]
+            rows.append("|".join(cells))
+        return "\n".join(rows)
+
+    def _format_agent_prompts(
+        self,
+        balances: Dict[str, float],
+        mindshares: Dict[str, dict],
+        use_single_prompt: bool,
+        trends: Optional[Dict[str, dict]] = None,
+        trend_days: int = 30,
+        stable_prefix: bool = False,
+        compact: bool = False,
+        balances_unavailable: bool = False,
+    ) -> Tuple[str, List[str]]:
+        if balances_unavailable:
+            balance_keys = BALANCES_UNAVAILABLE
+        else:
+            balance_keys = self._format_token_list(list(balances.keys()), compact)
+        if stable_prefix:
+            # The instructions come from format_prompt_prefix; this prompt only carries the portfolio
+            system_prompt = f"User's portfolio: {balance_keys}"
+        else:
+            system_prompt = self._load_system_template().format(
+                asset_keys=self._format_token_list(self.get_allowed_assets(), compact),
+                balance_keys=balance_keys,
+            )
+
+        # Create the additional prompts from the mindshare balances
         # Note, in the original agent, the mindshare prompts are passed in as additional assistant prompts. If use_single_prompt is True, the mindshare prompts will be included in the main system prompt.
         mindshare_prompts = []
-        for token, amount in balances.items():
-            mindshare = self.get_mindshare(token, mock=mock_mindshare)
-            if "error" not in mindshare:
-                mindshare_value = mindshare["mindshare"]
-                mindshare_prompts.append(
-                    f"I have {amount} {token} and mindshare for this token is: {mindshare_value}"
-                )
-            else:
-                mindshare_prompts.append(f"Error: No data available for {token}")
+        if compact and not balances_unavailable:
+            mindshare_prompts.append(
+                self._format_compact_table(balances, mindshares, trends, trend_days)
+            )
+        else:
+            for token, amount in balances.items():
+                mindshare = mindshares[token]
+                if "error" not in mindshare:
+                    mindshare_value = mindshare["mindshare"]
+                    mindshare_prompts.append(
+                        f"I have {amount} {token} and mindshare for this token is: {mindshare_value}"
+                    )
+                else:
+                    mindshare_prompts.append(f"Error: No data available for {token}")
+                if trends and token in trends:
+                    trend_prompt = self._format_trend(token, trends[token], trend_days)
+                    if trend_prompt:
+                        mindshare_prompts.append(trend_prompt)
 
         if use_single_prompt:
             # Combine the system prompt with mindshare prompts
@@ -164,3 +587,154 @@ class AgentSetup:
             mindshare_prompts = []
 
         return system_prompt, mindshare_prompts
+
+    def _fallback_balances(self) -> Optional[Dict[str, float]]:
+        """Last balances known for the account when the live lookup missed the deadline, None if there are none"""
+        if self._last_known_balances is not None:
+            return dict(self._last_known_balances)
+        if self.balance_cache is not None and self.account is not None:
+            known = self.balance_cache.peek_many(
+                [self._balance_cache_key(token) for token in ASSET_MAP]
+            )
+            if known:
+                return {
+                    token: known[self._balance_cache_key(token)]
+                    for token in ASSET_MAP
+                    if self._balance_cache_key(token) in known
+                }
+        return None
+
+    def _settle_mindshares(
+        self, mindshares: Dict[str, dict], budget: DeadlineBudget
+    ) -> Dict[str, dict]:
+        """Replace lookups that missed the deadline with the last known value and remember fresh ones"""
+        settled = {}
+        for token, mindshare in mindshares.items():
+            if mindshare.get("error") == DEADLINE_EXCEEDED_ERROR:
+                budget.timed_out.append(f"mindshare:{token}")
+                mindshare = self._last_known_mindshares.get(token, mindshare)
+            elif "error" not in mindshare:
+                self._last_known_mindshares[token] = mindshare
+            settled[token] = mindshare
+        return settled
+
+    def create_agent_prompts(
+        self,
+        mock_balances: bool = True,
+        mock_mindshare: bool = True,
+        use_single_prompt: bool = True,
+        include_trends: bool = False,
+        trend_days: int = 30,
+        deadline: Optional[float] = None,
+        stable_prefix: bool = False,
+        compact_context: bool = False,
+    ) -> Tuple[str, List[str]]:
+        # With a deadline (in seconds), lookups that are too slow fall back to the last known value
+        # or to the "No data available" line instead of holding up the build
+        budget = DeadlineBudget(deadline)
+        try:
+            # Get balances for the account
+            balances_unavailable = False
+            with budget.stage("balances"):
+                try:
+                    balances = budget.run(lambda: self.get_balances(mock=mock_balances))
+                    self._last_known_balances = dict(balances)
+                except TimeoutError:
+                    budget.timed_out.append("balances")
+                    balances = self._fallback_balances()
+                    if balances is None:
+                        balances_unavailable = True
+                        balances = {}
+
+            # Get the mindshare for every held token
+            with budget.stage("mindshare"):
+                mindshares = self.get_mindshares(
+                    list(balances), mock=mock_mindshare, timeout=budget.remaining()
+                )
+                mindshares = self._settle_mindshares(mindshares, budget)
+
+            # Trends need real Kaito history, so they are skipped for mocked mindshare
+            trends = None
+            if include_trends and not mock_mindshare:
+                with budget.stage("trends"):
+                    try:
+                        trends = budget.run(
+                            lambda: self.get_mindshare_trends(list(balances), days=trend_days)
+                        )
+                    except TimeoutError:
+                        budget.timed_out.append("trends")
+        finally:
+            budget.close()
+
+        with budget.stage("format"):
+            prompts = self._format_agent_prompts(
+                balances,
+                mindshares,
+                use_single_prompt,
+                trends,
+                trend_days,
+                stable_prefix,
+                compact_context,
+                balances_unavailable,
+            )
+        self.last_prompt_timings = budget.summary()
+        return prompts
+
+    async def acreate_agent_prompts(
+        self,
+        mock_balances: bool = True,
+        mock_mindshare: bool = True,
+        use_single_prompt: bool = True,
+        include_trends: bool = False,
+        trend_days: int = 30,
+        deadline: Optional[float] = None,
+        stable_prefix: bool = False,
+        compact_context: bool = False,
+    ) -> Tuple[str, List[str]]:
+        """Async version of create_agent_prompts, safe to call from a running event loop"""
+        budget = DeadlineBudget(deadline)
+
+        balances_unavailable = False
+        with budget.stage("balances"):
+            try:
+                balances = await asyncio.wait_for(
+                    self.aget_balances(mock=mock_balances), budget.remaining()
+                )
+                self._last_known_balances = dict(balances)
+            except TimeoutError:
+                budget.timed_out.append("balances")
+                balances = self._fallback_balances()
+                if balances is None:
+                    balances_unavailable = True
+                    balances = {}
+
+        with budget.stage("mindshare"):
+            mindshares = await self.aget_mindshares(
+                list(balances), mock=mock_mindshare, timeout=budget.remaining()
+            )
+            mindshares = self._settle_mindshares(mindshares, budget)
+
+        trends = None
+        if include_trends and not mock_mindshare:
+            with budget.stage("trends"):
+                try:
+                    trends = await asyncio.wait_for(
+                        self.aget_mindshare_trends(list(balances), days=trend_days),
+                        budget.remaining(),
+                    )
+                except TimeoutError:
+                    budget.timed_out.append("trends")
+
+        with budget.stage("format"):
+            prompts = self._format_agent_prompts(
+                balances,
+                mindshares,
+                use_single_prompt,
+                trends,
+                trend_days,
+                stable_prefix,
+                compact_context,
+                balances_unavailable,
+            )
+        self.last_prompt_timings = budget.summary()
+        return prompts
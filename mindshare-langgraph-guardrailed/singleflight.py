@@ -0,0 +1,93 @@
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class _Call:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical lookups into a single upstream request.
+
+    While a call for a key is in flight, other callers asking for the same key (from other threads with do, or
+    other coroutines on the same event loop with ado) wait for it and get its result or exception instead of
+    issuing their own request. executed counts upstream calls, suppressed counts the duplicates avoided.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.executed = 0
+        self.suppressed = 0
+        self._calls: Dict[Hashable, _Call] = {}
+        self._tasks: Dict[Tuple[asyncio.AbstractEventLoop, Hashable], asyncio.Task] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[[], T]) -> T:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+                self.executed += 1
+            else:
+                self.suppressed += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+        return call.result
+
+    def _forget(self, task_key, task: asyncio.Task):
+        with self._lock:
+            if self._tasks.get(task_key) is task:
+                del self._tasks[task_key]
+
+    async def ado(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        """Async version of do. The shared call runs as its own task, so a cancelled caller does not cancel it"""
+        loop = asyncio.get_running_loop()
+        task_key = (loop, key)
+        with self._lock:
+            task = self._tasks.get(task_key)
+            if task is None:
+                task = loop.create_task(fn())
+                self._tasks[task_key] = task
+                task.add_done_callback(lambda done: self._forget(task_key, done))
+                self.executed += 1
+            else:
+                self.suppressed += 1
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "executed": self.executed,
+                "suppressed": self.suppressed,
+                "in_flight": len(self._calls) + len(self._tasks),
+            }
+
+
+# Process-wide groups, so that every AgentSetup built at the same time shares its in-flight lookups
+BALANCE_FLIGHTS = SingleFlight("balances")
+MINDSHARE_FLIGHTS = SingleFlight("mindshare")
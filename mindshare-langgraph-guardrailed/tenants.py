@@ -0,0 +1,91 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from portfolio_context import PortfolioContext, PortfolioContextRefresher
+from setup import AgentSetup
+from singleflight import SingleFlight
+
+# (network, account_id)
+TenantKey = Tuple[str, str]
+
+
+class TenantContexts:
+    """
+    Bounded LRU of per-account portfolio contexts, so one graph can serve many NEAR accounts.
+
+    Each tenant gets a read-only AgentSetup from base.for_account, which shares the Kaito client, caches and
+    RPC clients of the base setup, and a PortfolioContextRefresher that holds its current context. Contexts
+    are built on first use and rebuilt once they are older than context_ttl seconds; concurrent requests
+    for the same account share one build. The least recently used tenant is dropped beyond max_tenants.
+    """
+
+    def __init__(
+        self,
+        base: AgentSetup,
+        max_tenants: int = 1024,
+        context_ttl: Optional[float] = 300.0,
+        **prompt_kwargs,
+    ):
+        self.base = base
+        self.max_tenants = max_tenants
+        self.context_ttl = context_ttl
+        self.prompt_kwargs = prompt_kwargs
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._tenants: "OrderedDict[TenantKey, PortfolioContextRefresher]" = OrderedDict()
+        self._flights = SingleFlight("tenant_contexts")
+        self._lock = threading.Lock()
+
+    def _is_fresh(self, context: Optional[PortfolioContext]) -> bool:
+        if context is None:
+            return False
+        return self.context_ttl is None or time.time() - context.built_at < self.context_ttl
+
+    def _refresher(self, key: TenantKey) -> PortfolioContextRefresher:
+        with self._lock:
+            refresher = self._tenants.get(key)
+            if refresher is None:
+                network, account_id = key
+                refresher = PortfolioContextRefresher(
+                    self.base.for_account(account_id, network), **self.prompt_kwargs
+                )
+                self._tenants[key] = refresher
+                while len(self._tenants) > self.max_tenants:
+                    self._tenants.popitem(last=False)
+                    self.evictions += 1
+            else:
+                self._tenants.move_to_end(key)
+            return refresher
+
+    async def aget(self, account_id: str, network: Optional[str] = None) -> PortfolioContext:
+        """The current portfolio context of an account, building it if it is missing or stale"""
+        key = (network or self.base.network or "mainnet", account_id)
+        refresher = self._refresher(key)
+        context = refresher.current
+        if self._is_fresh(context):
+            self.hits += 1
+            return context
+        self.misses += 1
+        return await self._flights.ado(key, refresher.refresh)
+
+    def invalidate(self, account_id: Optional[str] = None, network: Optional[str] = None):
+        """Drop every tenant, or only those matching the given account and/or network"""
+        with self._lock:
+            for key in list(self._tenants):
+                if (network is None or key[0] == network) and (
+                    account_id is None or key[1] == account_id
+                ):
+                    del self._tenants[key]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "tenants": len(self._tenants),
+                "max_tenants": self.max_tenants,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
@@ -1,8 +1,19 @@
+import asyncio
+import contextlib
 import os
+import uuid
 
 from pydantic import SecretStr
 from setup import AgentSetup
-from typing import Optional, List, Dict
+from portfolio_context import PortfolioContext, PortfolioContextRefresher
+from tenants import TenantContexts
+from graph_cache import GraphCache, release_when_collected
+from balance_cache import shared_balance_cache
+from mindshare_cache import shared_mindshare_cache
+from typing import Any, Optional, List, Dict
+from langchain_core.runnables import RunnableConfig
+from langgraph.config import get_stream_writer
+from langgraph.constants import TAG_NOSTREAM
 from langchain_openai import ChatOpenAI
 from langgraph.graph import StateGraph, MessagesState, START, END
 from langchain_core.messages import (
@@ -16,8 +27,23 @@ from langchain_core.messages import (
 from constants import (
     GUARDRAILS_INPUT_BLOCKED_MESSAGE,
     GUARDRAILS_OUTPUT_BLOCKED_MESSAGE,
+    PREFILTER_ALLOW_WORDS,
+    PREFILTER_DENY_PATTERNS,
 )
-from vijil_dome import Dome
+from guardrails import (
+    GuardPreFilter,
+    MicroBatcher,
+    ScannedMessages,
+    SpeculationStats,
+    TieredGuard,
+    dome_fingerprint,
+    read_text_list,
+    scan_inputs,
+    shared_guard_cache,
+    stream_guarded_output,
+)
+from dome_registry import DOME_REGISTRY
+from dome_pool import shared_dome_pool
 
 
 # Create the agent graph
@@ -28,23 +54,95 @@ def _create_agent_graph(
     account_id: Optional[str] = None,
     private_key: Optional[str] = None,
     network: Optional[str] = None,
+    rpc_endpoints: Optional[List[str]] = None,
+    hedge_rpc_requests: bool = False,
+    rpc_hedge_delay: Optional[float] = None,
     kaito_api_key: Optional[str] = None,
+    kaito_max_concurrency: int = 8,
+    mindshare_cache_path: Optional[str] = None,
+    mindshare_cache_ttl: float = 3600.0,
+    balance_cache_ttl: Optional[float] = None,
+    balance_cache_block_invalidation: bool = False,
     mock_balances: bool = True,
     mock_mindshare: bool = True,
     use_single_prompt: bool = True,
+    compact_context: bool = False,
+    include_mindshare_trends: bool = False,
+    mindshare_trend_days: int = 30,
+    prompt_deadline: Optional[float] = None,
+    context_refresh_interval: Optional[float] = None,
+    stable_prompt_prefix: bool = False,
+    max_tenant_contexts: int = 1024,
+    tenant_context_ttl: Optional[float] = 300.0,
     use_dome_guardrails: bool = True,
+    input_guard_concurrency: int = 4,
+    guard_cache_size: int = 0,
+    guard_cache_ttl: Optional[float] = None,
+    scan_new_messages_only: bool = False,
+    speculative_llm_call: bool = False,
+    stream_output: bool = False,
+    output_scan_window: int = 400,
+    tiered_guard: bool = False,
+    prefilter_max_chars: int = 200,
+    guard_allow_list_path: Optional[str] = None,
+    guard_deny_list_path: Optional[str] = None,
+    guard_batch_size: int = 0,
+    guard_batch_wait_ms: float = 5.0,
+    dome_process_pool_size: int = 0,
+    dome_pool_queue_depth: Optional[int] = None,
     warmup_dome: bool = True,
     dome_config_path: Optional[str] = None,
 ):
     """
     Create an agent with the given account ID, private key, network, and optional Kaito API key.
     """
-    agent_setup = AgentSetup(account_id, private_key, network, kaito_api_key)
+    agent_setup = AgentSetup(
+        account_id,
+        private_key,
+        network,
+        kaito_api_key,
+        rpc_endpoints=rpc_endpoints,
+        hedge_rpc_requests=hedge_rpc_requests,
+        rpc_hedge_delay=rpc_hedge_delay,
+        balance_cache=(
+            # With only block invalidation, entries have no age limit
+            shared_balance_cache(
+                balance_cache_ttl or None, balance_cache_block_invalidation
+            )
+            if balance_cache_ttl or balance_cache_block_invalidation
+            else None
+        ),
+        kaito_max_concurrency=kaito_max_concurrency,
+        mindshare_cache=(
+            shared_mindshare_cache(mindshare_cache_path, mindshare_cache_ttl)
+            if mindshare_cache_path
+            else None
+        ),
+    )
 
-    system_prompt, mindshare_prompts = agent_setup.create_agent_prompts(
+    prompt_kwargs = dict(
         mock_balances=mock_balances,
         mock_mindshare=mock_mindshare,
         use_single_prompt=use_single_prompt,
+        compact_context=compact_context,
+        include_trends=include_mindshare_trends,
+        trend_days=mindshare_trend_days,
+        deadline=prompt_deadline,
+        stable_prefix=stable_prompt_prefix,
+    )
+    # The balances and mindshare in the prompts are rebuilt every context_refresh_interval seconds, if set
+    context_refresher = PortfolioContextRefresher(
+        agent_setup, context_refresh_interval, **prompt_kwargs
+    )
+    # Without a NEAR account real balances can only be served per request, through configurable account_id
+    if agent_setup.account is not None or mock_balances:
+        context_refresher.build()
+    # Contexts of the other accounts served by this graph, built on first use
+    tenant_contexts = TenantContexts(
+        agent_setup,
+        max_tenants=max_tenant_contexts,
+        context_ttl=tenant_context_ttl,
+        **prompt_kwargs,
     )
 
     model_api_key = model_api_key or os.getenv("REDPILL_API_KEY")
@@ -56,39 +154,231 @@ def _create_agent_graph(
         model=model_name, base_url=base_url, api_key=SecretStr(model_api_key)
     )
 
-    if use_dome_guardrails:
-        dome = Dome(dome_config_path)
+    dome_pool = None
+    if use_dome_guardrails and dome_process_pool_size > 0:
+        # Scans run in worker processes that each load Dome once, so detectors can use every core
+        dome_pool = shared_dome_pool(
+            dome_config_path, dome_process_pool_size, dome_pool_queue_depth, warmup_dome
+        )
         if warmup_dome:
-            _ = dome.guard_input("This is an input guardrail warmup query")
-            _ = dome.guard_output("This is an output guardrail wamrup query")
+            ready = dome_pool.warm()
+            if ready < dome_pool.workers:
+                raise RuntimeError(
+                    f"Only {ready} of {dome_pool.workers} Dome pool workers loaded Dome"
+                )
+        scan_input = dome_pool.scan_input
+        scan_output = dome_pool.scan_output
 
-    async def agent_response(messages: Dict[str, List[BaseMessage]]):
-        input_messages = messages.get("messages", [])
-        # apply guardrails to the input message
-        if use_dome_guardrails:
-            for message in input_messages:
-                input_scan = dome.guard_input(message.content)
-                if input_scan.flagged:
-                    return {
-                        "messages": [
-                            AIMessage(content=GUARDRAILS_INPUT_BLOCKED_MESSAGE)
-                        ]
-                    }
+        async def scan_input_batch(contents: List[str]):
+            return await dome_pool.scan_batch("guard_input", contents)
+
+        async def scan_output_batch(contents: List[str]):
+            return await dome_pool.scan_batch("guard_output", contents)
+    elif use_dome_guardrails:
+        # One Dome per config path is shared by every graph in the process
+        dome = DOME_REGISTRY.get(dome_config_path)
+        if warmup_dome:
+            DOME_REGISTRY.warm(dome_config_path)
+
+        # The synchronous scans run in a worker thread so they do not block the event loop
+        async def scan_input(content: str):
+            return await asyncio.to_thread(dome.guard_input, content)
+
+        async def scan_output(content: str):
+            return await asyncio.to_thread(dome.guard_output, content)
+
+        # The texts of a batch are scanned concurrently, like the scans they replace
+        async def scan_input_batch(contents: List[str]):
+            return await asyncio.gather(
+                *(asyncio.to_thread(dome.guard_input, c) for c in contents)
+            )
+
+        async def scan_output_batch(contents: List[str]):
+            return await asyncio.gather(
+                *(asyncio.to_thread(dome.guard_output, c) for c in contents)
+            )
+
+    # Scans from concurrent requests are collected for up to guard_batch_wait_ms and sent to Dome together
+    guard_batchers = None
+    if use_dome_guardrails and guard_batch_size > 1:
+        guard_batchers = {
+            "input": MicroBatcher(
+                scan_input_batch, guard_batch_size, guard_batch_wait_ms / 1000
+            ),
+            "output": MicroBatcher(
+                scan_output_batch, guard_batch_size, guard_batch_wait_ms / 1000
+            ),
+        }
+        scan_input = guard_batchers["input"].scan
+        scan_output = guard_batchers["output"].scan
+
+    # Verdicts for text that was already scanned are reused, per Dome version and configuration
+    guard_cache = None
+    if use_dome_guardrails and guard_cache_size > 0:
+        guard_cache = shared_guard_cache(
+            dome_fingerprint(dome_config_path), guard_cache_size, guard_cache_ttl
+        )
+        scan_input = guard_cache.wrap("input", scan_input)
+        scan_output = guard_cache.wrap("output", scan_output)
+
+    # Clear cases are decided in process by a pre-filter and only the rest reach Dome
+    tiered_guards = None
+    if use_dome_guardrails and tiered_guard:
+        prefilter = GuardPreFilter(
+            allow_words=PREFILTER_ALLOW_WORDS,
+            deny_patterns=PREFILTER_DENY_PATTERNS,
+            allow_texts=read_text_list(guard_allow_list_path),
+            deny_texts=read_text_list(guard_deny_list_path),
+            max_allow_chars=prefilter_max_chars,
+        )
+        tiered_guards = {
+            "input": TieredGuard(prefilter, scan_input),
+            # Model output is never approved by its words, only blocked by the deny tier
+            "output": TieredGuard(prefilter, scan_output, allow=False),
+        }
+        scan_input = tiered_guards["input"].scan
+        scan_output = tiered_guards["output"].scan
+
+    # Messages approved in earlier turns of a thread are not scanned again
+    scanned_messages = (
+        ScannedMessages() if use_dome_guardrails and scan_new_messages_only else None
+    )
+
+    speculation = SpeculationStats()
+
+    def chat_messages_for(
+        context: PortfolioContext, input_messages: List[BaseMessage]
+    ) -> List[BaseMessage]:
+        # With a stable prefix, the system message starts with the instructions, which never change, and
+        # ends with the portfolio, so the start of every request is byte-identical
+        system_prompt = context.system_prompt
+        if context.prefix is not None:
+            system_prompt = f"{context.prefix}\n\n{system_prompt}"
         chat_messages: List[BaseMessage] = [SystemMessage(content=system_prompt)]
         # If single prompt is used, the mindshare prompts are included in the system prompt, and the list is empty
-        for balance_prompt in mindshare_prompts:
+        for balance_prompt in context.mindshare_prompts:
             chat_messages.append(AIMessage(content=balance_prompt))
         chat_messages.extend(input_messages)
+        return chat_messages
+
+    async def stream_text(chat_messages: List[BaseMessage]):
+        # Tagged nostream so LangGraph's "messages" stream mode does not pass on unscanned tokens
+        async for chunk in model.astream(chat_messages, config={"tags": [TAG_NOSTREAM]}):
+            if chunk.content:
+                yield chunk.content
+
+    async def generate(chat_messages: List[BaseMessage], release):
+        """The model's answer and its output scan result, or None if the output was not flagged"""
+        if stream_output:
+            return await stream_guarded_output(
+                stream_text(chat_messages),
+                scan_output if use_dome_guardrails else None,
+                release,
+                window_chars=output_scan_window,
+            )
         response = await model.ainvoke(chat_messages)
         # apply guardrails to the output message
         if use_dome_guardrails:
-            output_scan = dome.guard_output(response.content)
+            output_scan = await scan_output(response.content)
             if output_scan.flagged:
+                return response.content, output_scan
+        return response.content, None
+
+    async def agent_response(
+        messages: Dict[str, List[BaseMessage]], config: RunnableConfig
+    ):
+        # Any NEAR account can be served by passing configurable={"account_id": ..., "network": ...}
+        configurable = config.get("configurable", {})
+        tenant_account_id = configurable.get("account_id")
+        context = None
+        if tenant_account_id is None:
+            context_refresher.ensure_started()
+            # Read the context once so the whole request uses the same snapshot
+            context = context_refresher.current
+            if context is None:
+                raise ValueError(
+                    "No NEAR account is set up. Pass account_id in the configurable config."
+                )
+        input_messages = messages.get("messages", [])
+        thread_id = configurable.get("thread_id")
+
+        # With stream_output, scanned text is sent to the "custom" stream mode as {"released_text": ...},
+        # but only after the inputs have been found clean
+        inputs_clean = asyncio.Event()
+        writer = get_stream_writer() if stream_output else None
+
+        async def release(text: str):
+            await inputs_clean.wait()
+            writer({"released_text": text})
+
+        model_call = None
+        if use_dome_guardrails and speculative_llm_call:
+            # Start the model call while the inputs are scanned. Its answer is only used once they are clean
+            if context is None:
+                context = await tenant_contexts.aget(
+                    tenant_account_id, configurable.get("network")
+                )
+            model_call = asyncio.ensure_future(
+                generate(chat_messages_for(context, input_messages), release)
+            )
+            speculation.started += 1
+        # apply guardrails to the input messages. They are scanned concurrently and the first flagged one cancels the other scans
+        if use_dome_guardrails:
+            to_scan = input_messages
+            if scanned_messages is not None and thread_id is not None:
+                to_scan = scanned_messages.unscanned(thread_id, input_messages)
+            try:
+                if (
+                    dome_pool is None
+                    and warmup_dome
+                    and not DOME_REGISTRY.is_ready(dome_config_path)
+                ):
+                    # Requests that arrive during the warm-up wait for it instead of loading the models again
+                    with contextlib.suppress(Exception):
+                        await DOME_REGISTRY.wait_ready(dome_config_path)
+                input_scan = await scan_inputs(
+                    scan_input,
+                    [message.content for message in to_scan],
+                    max_concurrency=input_guard_concurrency,
+                )
+            except BaseException:
+                if model_call is not None:
+                    speculation.discard(model_call)
+                raise
+            if input_scan is not None:
+                if model_call is not None:
+                    speculation.discard(model_call)
                 return {
-                    "messages": [AIMessage(content=GUARDRAILS_OUTPUT_BLOCKED_MESSAGE)]
+                    "messages": [AIMessage(content=GUARDRAILS_INPUT_BLOCKED_MESSAGE)]
                 }
+            if scanned_messages is not None and thread_id is not None:
+                scanned_messages.approve(thread_id, to_scan)
+        inputs_clean.set()
+        if model_call is not None:
+            content, output_scan = await model_call
+            speculation.used += 1
+        else:
+            if context is None:
+                context = await tenant_contexts.aget(
+                    tenant_account_id, configurable.get("network")
+                )
+            content, output_scan = await generate(
+                chat_messages_for(context, input_messages), release
+            )
+        if output_scan is not None:
+            if writer is not None:
+                writer({"blocked": GUARDRAILS_OUTPUT_BLOCKED_MESSAGE})
+            return {"messages": [AIMessage(content=GUARDRAILS_OUTPUT_BLOCKED_MESSAGE)]}
 
-        return {"messages": [AIMessage(content=response.content)]}
+        reply = AIMessage(
+            id=str(uuid.uuid4()),
+            content=content,
+            response_metadata={"prompt_prefix_hash": context.prefix_hash},
+        )
+        # The reply passed the output guard, so it does not need an input scan when it comes back as history
+        if scanned_messages is not None and thread_id is not None:
+            scanned_messages.approve(thread_id, [reply])
+        return {"messages": [reply]}
 
     builder = StateGraph(MessagesState)
 
@@ -96,28 +386,155 @@ def _create_agent_graph(
     builder.add_node("mindshare-agent", agent_response)
     builder.add_edge(START, "mindshare-agent")
     builder.add_edge("mindshare-agent", END)
-    return builder.compile(checkpointer=None)
+    graph = builder.compile(checkpointer=None)
+    # Exposed so callers can read the stats() of these, or stop the refresh task
+    graph.agent_setup = agent_setup
+    graph.context_refresher = context_refresher
+    graph.tenant_contexts = tenant_contexts
+    graph.guard_cache = guard_cache
+    graph.scanned_messages = scanned_messages
+    graph.speculation = speculation
+    graph.dome_pool = dome_pool
+    graph.guard_batchers = guard_batchers
+    graph.tiered_guards = tiered_guards
+    release_when_collected(graph)
+    return graph
 
 
-# Create using env vars
-def create_agent_graph():
-    return _create_agent_graph(
+# Arguments for _create_agent_graph from env vars
+def agent_graph_config() -> Dict[str, Any]:
+    return dict(
         model_name="phala/gemma-3-27b-it",
         base_url="https://api.redpill.ai/v1",
         model_api_key=os.getenv("REDPILL_API_KEY"),
         account_id=os.getenv("NEAR_ACCOUNT_ID"),
         private_key=os.getenv("NEAR_PRIVATE_KEY"),
         network=os.getenv("NEAR_NETWORK", "mainnet"),
+        rpc_endpoints=[
+            url.strip()
+            for url in os.getenv("NEAR_RPC_ENDPOINTS", "").split(",")
+            if url.strip()
+        ],
+        hedge_rpc_requests=os.getenv("HEDGE_RPC_REQUESTS", "False").lower() == "true",
+        rpc_hedge_delay=(
+            float(os.getenv("RPC_HEDGE_DELAY"))
+            if os.getenv("RPC_HEDGE_DELAY")
+            else None
+        ),
         kaito_api_key=os.getenv("KAITO_API_KEY", None),
+        kaito_max_concurrency=int(os.getenv("KAITO_MAX_CONCURRENCY", "8")),
+        mindshare_cache_path=os.getenv("MINDSHARE_CACHE_PATH", None),
+        mindshare_cache_ttl=float(os.getenv("MINDSHARE_CACHE_TTL", "3600")),
+        balance_cache_ttl=float(os.getenv("BALANCE_CACHE_TTL", "0")),
+        balance_cache_block_invalidation=os.getenv(
+            "BALANCE_CACHE_BLOCK_INVALIDATION", "False"
+        ).lower()
+        == "true",
         mock_balances=os.getenv("MOCK_BALANCES", "True").lower() == "true",
         mock_mindshare=os.getenv("MOCK_MINDSHARE", "True").lower() == "true",
         use_single_prompt=os.getenv("USE_SINGLE_PROMPT", "True").lower() == "true",
+        compact_context=os.getenv("COMPACT_CONTEXT", "False").lower() == "true",
+        include_mindshare_trends=os.getenv("MINDSHARE_TRENDS", "False").lower()
+        == "true",
+        mindshare_trend_days=int(os.getenv("MINDSHARE_TREND_DAYS", "30")),
+        prompt_deadline=(
+            float(os.getenv("PROMPT_DEADLINE"))
+            if os.getenv("PROMPT_DEADLINE")
+            else None
+        ),
+        context_refresh_interval=(
+            float(os.getenv("CONTEXT_REFRESH_INTERVAL"))
+            if os.getenv("CONTEXT_REFRESH_INTERVAL")
+            else None
+        ),
+        stable_prompt_prefix=os.getenv("STABLE_PROMPT_PREFIX", "False").lower()
+        == "true",
+        max_tenant_contexts=int(os.getenv("MAX_TENANT_CONTEXTS", "1024")),
+        tenant_context_ttl=float(os.getenv("TENANT_CONTEXT_TTL", "300")),
         use_dome_guardrails=os.getenv("USE_DOME_GUARDRAILS", "False").lower() == "true",
+        input_guard_concurrency=int(os.getenv("INPUT_GUARD_CONCURRENCY", "4")),
+        guard_cache_size=int(os.getenv("GUARD_CACHE_SIZE", "0")),
+        guard_cache_ttl=(
+            float(os.getenv("GUARD_CACHE_TTL"))
+            if os.getenv("GUARD_CACHE_TTL")
+            else None
+        ),
+        scan_new_messages_only=os.getenv("SCAN_NEW_MESSAGES_ONLY", "False").lower()
+        == "true",
+        speculative_llm_call=os.getenv("SPECULATIVE_LLM_CALL", "False").lower()
+        == "true",
+        stream_output=os.getenv("STREAM_OUTPUT", "False").lower() == "true",
+        output_scan_window=int(os.getenv("OUTPUT_SCAN_WINDOW", "400")),
+        tiered_guard=os.getenv("TIERED_GUARD", "False").lower() == "true",
+        prefilter_max_chars=int(os.getenv("PREFILTER_MAX_CHARS", "200")),
+        guard_allow_list_path=os.getenv("GUARD_ALLOW_LIST", None),
+        guard_deny_list_path=os.getenv("GUARD_DENY_LIST", None),
+        guard_batch_size=int(os.getenv("GUARD_BATCH_SIZE", "0")),
+        guard_batch_wait_ms=float(os.getenv("GUARD_BATCH_WAIT_MS", "5")),
+        dome_process_pool_size=int(os.getenv("DOME_PROCESS_POOL_SIZE", "0")),
+        dome_pool_queue_depth=(
+            int(os.getenv("DOME_POOL_QUEUE_DEPTH"))
+            if os.getenv("DOME_POOL_QUEUE_DEPTH")
+            else None
+        ),
         warmup_dome=os.getenv("WARMUP_DOME", "False").lower() == "true",
         dome_config_path=os.getenv("DOME_CONFIG_PATH", None),
     )
 
 
+# Compiled graphs by configuration, shared by every create_agent_graph call in the process
+_graph_cache: Optional[GraphCache] = None
+
+# A cached graph serves many requests, so its balances and mindshare are rebuilt this often unless
+# CONTEXT_REFRESH_INTERVAL is set
+CACHED_GRAPH_CONTEXT_REFRESH_INTERVAL = 300.0
+
+
+def _cached_graph_config(config: Dict[str, Any]) -> Dict[str, Any]:
+    if config.get("context_refresh_interval") is None:
+        return {
+            **config,
+            "context_refresh_interval": CACHED_GRAPH_CONTEXT_REFRESH_INTERVAL,
+        }
+    return config
+
+
+def get_graph_cache() -> GraphCache:
+    global _graph_cache
+    if _graph_cache is None:
+        _graph_cache = GraphCache(max_size=int(os.getenv("GRAPH_CACHE_SIZE", "4")))
+    return _graph_cache
+
+
+# Create using env vars. With GRAPH_CACHE, a graph already built for the same configuration is reused
+def create_agent_graph(use_cache: bool = True):
+    config = agent_graph_config()
+    if not use_cache or os.getenv("GRAPH_CACHE", "False").lower() != "true":
+        return _create_agent_graph(**config)
+    return get_graph_cache().get_or_build(
+        _cached_graph_config(config), _create_agent_graph
+    )
+
+
+def prebuild_agent_graphs(*overrides: Dict[str, Any]):
+    """
+    Build graphs into the cache ahead of the first request, e.g. when a worker starts. Each override is
+    applied on top of the env var configuration; with none, the env var configuration is built.
+    """
+    for override in overrides or ({},):
+        get_graph_cache().get_or_build(
+            _cached_graph_config({**agent_graph_config(), **override}),
+            _create_agent_graph,
+        )
+
+
+def invalidate_agent_graphs(config: Optional[Dict[str, Any]] = None):
+    """Drop the cached graph for one configuration, or all of them, so the next call rebuilds it"""
+    get_graph_cache().invalidate(
+        _cached_graph_config(config) if config is not None else None
+    )
+
+
 if __name__ == "__main__":
     import logging
     import os
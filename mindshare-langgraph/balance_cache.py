@@ -0,0 +1,120 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, Iterable, Optional, Tuple
+
+# (network, account_id, token_id)
+BalanceKey = Tuple[str, str, str]
+
+
+class _Entry:
+    __slots__ = ("value", "fetched_at", "block_height")
+
+    def __init__(self, value: float, fetched_at: float, block_height: Optional[int]):
+        self.value = value
+        self.fetched_at = fetched_at
+        self.block_height = block_height
+
+
+class BalanceCache:
+    """
+    Bounded cache of intents.near balances keyed by (network, account_id, token_id).
+
+    By default an entry is fresh for ttl seconds. With invalidate_on_new_block=True an entry instead stays
+    fresh until the final block height advances past the height it was read at (ttl, if set, still caps
+    its age). Hits, misses and stale reads are counted for monitoring.
+    """
+
+    def __init__(
+        self,
+        ttl: Optional[float] = 30.0,
+        invalidate_on_new_block: bool = False,
+        max_entries: int = 10000,
+    ):
+        self.ttl = ttl
+        self.invalidate_on_new_block = invalidate_on_new_block
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self._entries: "OrderedDict[BalanceKey, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _is_fresh(self, entry: _Entry, block_height: Optional[int], now: float) -> bool:
+        if self.ttl is not None and now - entry.fetched_at >= self.ttl:
+            return False
+        if self.invalidate_on_new_block:
+            return (
+                block_height is not None
+                and entry.block_height is not None
+                and block_height <= entry.block_height
+            )
+        return True
+
+    def get_many(
+        self, keys: Iterable[BalanceKey], block_height: Optional[int] = None
+    ) -> Dict[BalanceKey, float]:
+        """Return the fresh cached balances among keys. block_height is the current final block height"""
+        now = time.monotonic()
+        found = {}
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is None:
+                    self.misses += 1
+                elif not self._is_fresh(entry, block_height, now):
+                    self.stale += 1
+                else:
+                    self.hits += 1
+                    self._entries.move_to_end(key)
+                    found[key] = entry.value
+        return found
+
+    def peek_many(self, keys: Iterable[BalanceKey]) -> Dict[BalanceKey, float]:
+        """Return every cached balance among keys, fresh or not, without touching the counters"""
+        with self._lock:
+            return {key: self._entries[key].value for key in keys if key in self._entries}
+
+    def put_many(
+        self, values: Dict[BalanceKey, float], block_height: Optional[int] = None
+    ):
+        now = time.monotonic()
+        with self._lock:
+            for key, value in values.items():
+                self._entries[key] = _Entry(value, now, block_height)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, network: Optional[str] = None, account_id: Optional[str] = None):
+        """Drop every entry, or only those for the given network and/or account"""
+        with self._lock:
+            for key in list(self._entries):
+                if (network is None or key[0] == network) and (
+                    account_id is None or key[1] == account_id
+                ):
+                    del self._entries[key]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale": self.stale,
+                "entries": len(self._entries),
+            }
+
+
+_shared_caches: Dict[Hashable, BalanceCache] = {}
+_shared_caches_lock = threading.Lock()
+
+
+def shared_balance_cache(
+    ttl: Optional[float] = 30.0, invalidate_on_new_block: bool = False
+) -> BalanceCache:
+    """Process-wide cache for the given settings, so rebuilt AgentSetups reuse earlier reads"""
+    key = (ttl, invalidate_on_new_block)
+    with _shared_caches_lock:
+        if key not in _shared_caches:
+            _shared_caches[key] = BalanceCache(ttl, invalidate_on_new_block)
+        return _shared_caches[key]
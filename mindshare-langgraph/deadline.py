@@ -0,0 +1,55 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class DeadlineBudget:
+    """Total time budget for building the agent prompts, with per-stage timings"""
+
+    def __init__(self, seconds: Optional[float] = None):
+        self.seconds = seconds
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self.timed_out: List[str] = []
+        # Lookups abandoned at the deadline keep running on this build's threads, not on ones other builds need
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left in the budget, or None if there is no deadline"""
+        if self.seconds is None:
+            return None
+        return max(0.0, self.seconds - (time.perf_counter() - self.started))
+
+    def run(self, fn: Callable[[], T]) -> T:
+        """Run fn, raising TimeoutError if it has not finished when the budget runs out"""
+        timeout = self.remaining()
+        if timeout is None:
+            return fn()
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(thread_name_prefix="prompt-deadline")
+        # The worker thread cannot be interrupted; it finishes in the background and its result is dropped
+        return self._executor.submit(fn).result(timeout=timeout)
+
+    def close(self):
+        """Release the build's threads once the lookups still running finish"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = (time.perf_counter() - start) * 1000
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "deadline_ms": None if self.seconds is None else self.seconds * 1000,
+            "total_ms": (time.perf_counter() - self.started) * 1000,
+            "stages_ms": dict(self.stages),
+            "timed_out": list(self.timed_out),
+        }
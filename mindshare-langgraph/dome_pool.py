@@ -0,0 +1,192 @@
+import asyncio
+import contextlib
+import multiprocessing
+import threading
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Hashable, List, NamedTuple, Optional
+
+from vijil_dome import Dome
+
+from dome_registry import WARMUP_INPUT, WARMUP_OUTPUT
+
+
+class PooledScan(NamedTuple):
+    """The parts of a Dome scan result that are sent back from a worker process"""
+
+    flagged: bool
+    response_string: str
+    exec_time: Optional[float]
+
+
+# The Dome of the current worker process, loaded once by _init_worker
+_worker_dome: Optional[Dome] = None
+# Shared by every worker of the pool, see _ready
+_worker_barrier = None
+
+
+def _init_worker(config_path: Optional[str], warmup: bool, barrier):
+    global _worker_dome, _worker_barrier
+    _worker_barrier = barrier
+    _worker_dome = Dome(config_path)
+    if warmup:
+        _worker_dome.guard_input(WARMUP_INPUT)
+        _worker_dome.guard_output(WARMUP_OUTPUT)
+
+
+def _ready(timeout: Optional[float]) -> int:
+    # A worker waiting here cannot take another ready call, so each call is answered by a different worker
+    # once all of them have loaded Dome. If the wait times out, the workers that did arrive still report
+    with contextlib.suppress(threading.BrokenBarrierError):
+        _worker_barrier.wait(timeout)
+    return multiprocessing.current_process().pid
+
+
+def _scan(guard: str, content: str) -> PooledScan:
+    result = getattr(_worker_dome, guard)(content)
+    return PooledScan(
+        bool(result.flagged),
+        getattr(result, "response_string", ""),
+        getattr(result, "exec_time", None),
+    )
+
+
+def _scan_batch(guard: str, contents: List[str]) -> List[PooledScan]:
+    return [_scan(guard, content) for content in contents]
+
+
+class DomePool:
+    """
+    Dome scans in a pool of worker processes, so CPU-heavy detectors neither block the event loop nor
+    share one core with it.
+
+    Each worker loads Dome for config_path once when it starts and, with warmup, runs one input and one
+    output scan. warm() starts every worker and waits until each of them has reported that it is loaded. At most queue_depth scans
+    are sent to the pool at a time; further scans wait their turn in the event loop. Scan results are
+    PooledScan tuples rather than Dome's own result objects, which are not sent between processes.
+    """
+
+    def __init__(
+        self,
+        config_path: Optional[str] = None,
+        workers: int = 2,
+        queue_depth: Optional[int] = None,
+        warmup: bool = True,
+    ):
+        self.workers = max(1, workers)
+        self.queue_depth = queue_depth or 2 * self.workers
+        self.scans = 0
+        self.in_flight = 0
+        self.waiting = 0
+        self.max_in_flight = 0
+        # Forking a process that has already loaded models or started threads is not safe
+        context = multiprocessing.get_context("spawn")
+        self._barrier = context.Barrier(self.workers)
+        self._warm_lock = threading.Lock()
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(config_path, warmup, self._barrier),
+        )
+        self._slots: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = (
+            weakref.WeakKeyDictionary()
+        )
+
+    def warm(self, timeout: Optional[float] = None) -> int:
+        """
+        Start every worker and wait until they have all loaded Dome, or until timeout seconds after the first
+        one has. Returns the number of distinct workers that reported; fewer than workers means some never
+        started, e.g. because loading Dome failed.
+        """
+        with self._warm_lock:
+            self._barrier.reset()
+            pids = set()
+            # A worker that failed to load Dome breaks the pool, which fails the remaining ready calls
+            with contextlib.suppress(BrokenProcessPool):
+                futures = [
+                    self._executor.submit(_ready, timeout) for _ in range(self.workers)
+                ]
+                for future in futures:
+                    pids.add(future.result())
+            return len(pids)
+
+    async def wait_ready(self, timeout: Optional[float] = None) -> int:
+        return await asyncio.to_thread(self.warm, timeout)
+
+    def _slot(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if loop not in self._slots:
+            self._slots[loop] = asyncio.Semaphore(self.queue_depth)
+        return self._slots[loop]
+
+    async def scan(self, guard: str, content: str) -> PooledScan:
+        return await self._submit(1, _scan, guard, content)
+
+    async def scan_batch(self, guard: str, contents: List[str]) -> List[PooledScan]:
+        """
+        Scan several texts, split into one chunk per worker so the chunks are scanned in parallel. Each chunk
+        takes one slot and one round trip
+        """
+        size = -(-len(contents) // self.workers)
+        chunks = [contents[i : i + size] for i in range(0, len(contents), size)]
+        results = await asyncio.gather(
+            *(self._submit(len(chunk), _scan_batch, guard, chunk) for chunk in chunks)
+        )
+        return [scan for chunk in results for scan in chunk]
+
+    async def _submit(self, texts: int, fn, *args):
+        """Run fn(*args) in a worker once a slot is free; texts is the number of texts it scans"""
+        self.waiting += 1
+        try:
+            await self._slot().acquire()
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._executor, fn, *args
+            )
+        finally:
+            self.in_flight -= 1
+            self.scans += texts
+            self._slot().release()
+
+    async def scan_input(self, content: str) -> PooledScan:
+        return await self.scan("guard_input", content)
+
+    async def scan_output(self, content: str) -> PooledScan:
+        return await self.scan("guard_output", content)
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "queue_depth": self.queue_depth,
+            "scans": self.scans,
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "waiting": self.waiting,
+        }
+
+
+_shared_pools: Dict[Hashable, DomePool] = {}
+_shared_pools_lock = threading.Lock()
+
+
+def shared_dome_pool(
+    config_path: Optional[str] = None,
+    workers: int = 2,
+    queue_depth: Optional[int] = None,
+    warmup: bool = True,
+) -> DomePool:
+    """Process-wide pool for the given settings, so every graph with the same Dome config shares its workers"""
+    key = (config_path, workers, queue_depth, warmup)
+    with _shared_pools_lock:
+        if key not in _shared_pools:
+            _shared_pools[key] = DomePool(config_path, workers, queue_depth, warmup)
+        return _shared_pools[key]
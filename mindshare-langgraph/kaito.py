@@ -0,0 +1,275 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple, Union
+
+import httpx
+import requests
+from constants import DEADLINE_EXCEEDED_ERROR
+from mindshare_cache import MindshareCache
+from near_rpc import aclose_client
+from requests.adapters import HTTPAdapter
+from singleflight import SingleFlight
+
+KAITO_BASE_URL = "https://api.kaito.ai/api/v1"
+
+
+class KaitoClient:
+    """
+    Kaito mindshare client that reuses pooled keep-alive connections.
+
+    get_mindshares fetches many tokens concurrently from a requests.Session in a thread pool, and
+    aget_mindshares does the same on the event loop with an httpx.AsyncClient. Both cap the number
+    of requests in flight at max_concurrency and return {"mindshare": value} or {"error": message}
+    per token, like AgentSetup.get_mindshare. With a MindshareCache, cached values are returned without
+    a request and every response is written back to the cache. With a SingleFlight group, concurrent lookups
+    of the same token share one request.
+
+    The session, thread pool and async client stay open until close() or aclose(); the client can also be
+    used as a context manager (sync or async) that closes it on exit.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str = KAITO_BASE_URL,
+        max_concurrency: int = 8,
+        timeout: Optional[float] = None,
+        cache: Optional[MindshareCache] = None,
+        flights: Optional[SingleFlight] = None,
+    ):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.cache = cache
+        self.flights = flights
+
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._session.headers.update({"x-api-key": api_key})
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_concurrency, thread_name_prefix="kaito"
+        )
+
+        self._async_client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _request_params(self, token: str) -> Dict[str, str]:
+        today = datetime.now().strftime("%Y-%m-%d")
+        yesterday = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
+        return {"token": token, "start_date": yesterday, "end_date": today}
+
+    def _parse_response(self, token: str, status_code: int, text: str, json_fn):
+        print(f"Kaito API response for {token}: {text}")  # Debug log
+        if status_code == 200:
+            data = json_fn()
+            if self.cache is not None:
+                self.cache.store(token, data["mindshare"])
+            mindshare_value = list(data["mindshare"].values())[0]
+            return {"mindshare": mindshare_value}
+        else:
+            return {"error": "Failed to get mindshare"}
+
+    def _get_cached_mindshare(self, token: str, params: Dict[str, str]):
+        if self.cache is None:
+            return None
+        value = self.cache.lookup(token, params["start_date"], params["end_date"])
+        return None if value is None else {"mindshare": value}
+
+    def _flight_key(self, token: str, params: Dict[str, str]):
+        return (self.base_url, token, params["start_date"], params["end_date"])
+
+    def get_mindshare(self, token: str):
+        params = self._request_params(token)
+        if self.flights is None:
+            return self._fetch_mindshare(token, params)
+        return self.flights.do(
+            self._flight_key(token, params),
+            lambda: self._fetch_mindshare(token, params),
+        )
+
+    def _fetch_mindshare(self, token: str, params: Dict[str, str]):
+        cached = self._get_cached_mindshare(token, params)
+        if cached is not None:
+            return cached
+        response = self._session.get(
+            f"{self.base_url}/mindshare", params=params, timeout=self.timeout
+        )
+        return self._parse_response(
+            token, response.status_code, response.text, response.json
+        )
+
+    def _get_mindshare_or_error(self, token: str):
+        try:
+            return self.get_mindshare(token)
+        except Exception as e:
+            print(f"Error getting mindshare for {token}: {str(e)}")
+            return {"error": "Failed to get mindshare"}
+
+    def get_mindshares(
+        self, tokens: List[str], timeout: Optional[float] = None
+    ) -> Dict[str, dict]:
+        """
+        Fetch mindshare for every token concurrently, at most max_concurrency at a time. Tokens that are
+        not done after timeout seconds get a DEADLINE_EXCEEDED_ERROR entry.
+        """
+        futures = [
+            self._executor.submit(self._get_mindshare_or_error, token)
+            for token in tokens
+        ]
+        done, _ = wait(futures, timeout=timeout)
+        results = {}
+        for token, future in zip(tokens, futures):
+            if future in done:
+                results[token] = future.result()
+            else:
+                future.cancel()
+                results[token] = {"error": DEADLINE_EXCEEDED_ERROR}
+        return results
+
+    async def _ensure_async_client(self) -> httpx.AsyncClient:
+        # httpx pools and asyncio semaphores belong to one event loop
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._loop is not loop:
+            old_client, old_loop = self._async_client, self._loop
+            client = httpx.AsyncClient(
+                headers={"x-api-key": self.api_key},
+                limits=httpx.Limits(
+                    max_connections=self.max_concurrency,
+                    max_keepalive_connections=self.max_concurrency,
+                ),
+                timeout=self.timeout,
+            )
+            self._async_client = client
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._loop = loop
+            if old_client is not None:
+                await aclose_client(old_client, old_loop)
+            return client
+        return self._async_client
+
+    async def aget_mindshare(self, token: str):
+        params = self._request_params(token)
+        if self.flights is None:
+            return await self._afetch_mindshare(token, params)
+        return await self.flights.ado(
+            self._flight_key(token, params),
+            lambda: self._afetch_mindshare(token, params),
+        )
+
+    async def _afetch_mindshare(self, token: str, params: Dict[str, str]):
+        # SQLite lookups are local and sub-millisecond, so they run on the loop directly
+        cached = self._get_cached_mindshare(token, params)
+        if cached is not None:
+            return cached
+        client = await self._ensure_async_client()
+        try:
+            async with self._semaphore:
+                response = await client.get(f"{self.base_url}/mindshare", params=params)
+            return self._parse_response(
+                token, response.status_code, response.text, response.json
+            )
+        except Exception as e:
+            print(f"Error getting mindshare for {token}: {str(e)}")
+            return {"error": "Failed to get mindshare"}
+
+    async def aget_mindshares(
+        self, tokens: List[str], timeout: Optional[float] = None
+    ) -> Dict[str, dict]:
+        """Async version of get_mindshares"""
+        if not tokens:
+            return {}
+        tasks = [asyncio.ensure_future(self.aget_mindshare(token)) for token in tokens]
+        done, pending = await asyncio.wait(tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        return {
+            token: task.result() if task in done else {"error": DEADLINE_EXCEEDED_ERROR}
+            for token, task in zip(tokens, tasks)
+        }
+
+    def _parse_series(self, token: str, status_code: int, json_fn) -> Dict[str, float]:
+        if status_code != 200:
+            raise ValueError(
+                f"Failed to get mindshare history for {token}: HTTP {status_code}"
+            )
+        series = json_fn()["mindshare"]
+        if self.cache is not None:
+            self.cache.store(token, series)
+        return series
+
+    def get_series(self, token: str, start_date: str, end_date: str) -> Dict[str, float]:
+        """Fetch the daily mindshare of a token over a date range in a single request"""
+        response = self._session.get(
+            f"{self.base_url}/mindshare",
+            params={"token": token, "start_date": start_date, "end_date": end_date},
+            timeout=self.timeout,
+        )
+        return self._parse_series(token, response.status_code, response.json)
+
+    def get_series_many(
+        self, ranges: List[Tuple[str, str, str]]
+    ) -> List[Union[Dict[str, float], Exception]]:
+        """Fetch several (token, start_date, end_date) ranges concurrently. Failures are returned, not raised"""
+
+        def fetch(request):
+            try:
+                return self.get_series(*request)
+            except Exception as e:
+                return e
+
+        return list(self._executor.map(fetch, ranges))
+
+    async def aget_series(
+        self, token: str, start_date: str, end_date: str
+    ) -> Dict[str, float]:
+        """Async version of get_series"""
+        client = await self._ensure_async_client()
+        async with self._semaphore:
+            response = await client.get(
+                f"{self.base_url}/mindshare",
+                params={"token": token, "start_date": start_date, "end_date": end_date},
+            )
+        return self._parse_series(token, response.status_code, response.json)
+
+    async def aget_series_many(
+        self, ranges: List[Tuple[str, str, str]]
+    ) -> List[Union[Dict[str, float], Exception]]:
+        """Async version of get_series_many"""
+        return await asyncio.gather(
+            *(self.aget_series(*request) for request in ranges), return_exceptions=True
+        )
+
+    def close(self):
+        """Close the session and the thread pool, and the async client if its event loop is still running"""
+        self._session.close()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        client, loop = self._async_client, self._loop
+        self._async_client = None
+        self._loop = None
+        if client is not None and loop is not None and loop.is_running():
+            asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+
+    async def aclose(self):
+        if self._async_client is not None:
+            client, loop = self._async_client, self._loop
+            self._async_client = None
+            self._loop = None
+            await aclose_client(client, loop)
+        self.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
@@ -0,0 +1,100 @@
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Optional
+
+
+class MindshareCache:
+    """
+    Persistent SQLite cache of Kaito mindshare values keyed by (token, date).
+
+    A value fetched after its day ended never changes, so it never expires. A value fetched while its day
+    was still open may have moved since, so it is only served for current_day_ttl seconds after it was
+    fetched, even once that day is over. The database uses WAL mode so several worker processes can share
+    one file.
+    """
+
+    def __init__(self, path: str, current_day_ttl: float = 3600.0):
+        self.path = path
+        self.current_day_ttl = current_day_ttl
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS mindshare (
+                    token TEXT NOT NULL,
+                    date TEXT NOT NULL,
+                    value REAL NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    final INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (token, date)
+                )
+                """
+            )
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(mindshare)")}
+            if "final" not in columns:
+                # Files written before rows recorded finality; their rows are fetched again once stale
+                self._conn.execute(
+                    "ALTER TABLE mindshare ADD COLUMN final INTEGER NOT NULL DEFAULT 0"
+                )
+
+    def lookup(self, token: str, start_date: str, end_date: str) -> Optional[float]:
+        """
+        Return the cached value for the earliest day in [start_date, end_date], which is the value the Kaito
+        client would pick from a fresh response, or None if it is missing or stale. end_date is today.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, fetched_at, final FROM mindshare"
+                " WHERE token = ? AND date >= ? AND date <= ? ORDER BY date LIMIT 1",
+                (token, start_date, end_date),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            value, fetched_at, final = row
+            if not final and time.time() - fetched_at >= self.current_day_ttl:
+                self.stale += 1
+                return None
+            self.hits += 1
+            return value
+
+    def store(self, token: str, series: Dict[str, float]):
+        """Save every (date, value) pair of a Kaito response. Only days before today are stored as final"""
+        now = time.time()
+        today = datetime.now().strftime("%Y-%m-%d")
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO mindshare (token, date, value, fetched_at, final)"
+                " VALUES (?, ?, ?, ?, ?)",
+                [
+                    (token, date, value, now, int(date < today))
+                    for date, value in series.items()
+                ],
+            )
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "stale": self.stale}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_shared_caches: Dict[str, MindshareCache] = {}
+_shared_caches_lock = threading.Lock()
+
+
+def shared_mindshare_cache(path: str, current_day_ttl: float = 3600.0) -> MindshareCache:
+    """One connection per database file for the whole process"""
+    with _shared_caches_lock:
+        if path not in _shared_caches:
+            _shared_caches[path] = MindshareCache(path, current_day_ttl)
+        return _shared_caches[path]
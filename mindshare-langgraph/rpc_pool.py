@@ -0,0 +1,365 @@
+import asyncio
+import json
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional, TypeVar
+
+import near_api
+import requests
+
+T = TypeVar("T")
+
+
+class NoHealthyEndpointError(Exception):
+    """Raised when every endpoint in the pool failed a request"""
+
+
+# Causes of NEAR RPC errors that every node would answer the same way, so failing over cannot help
+DETERMINISTIC_RPC_ERROR_CAUSES = frozenset(
+    [
+        "UNKNOWN_ACCOUNT",
+        "INVALID_ACCOUNT",
+        "UNKNOWN_ACCESS_KEY",
+        "NO_CONTRACT_CODE",
+        "CONTRACT_EXECUTION_ERROR",
+        "PARSE_ERROR",
+    ]
+)
+
+
+def is_deterministic_rpc_error(error: BaseException) -> bool:
+    """
+    Whether an RPC error payload is a contract or request error rather than a problem of the node.
+
+    Node-side errors such as timeouts, unknown or garbage-collected blocks and nodes that are still
+    syncing are not, so requests that hit them fail over to another endpoint.
+    """
+    payload = error.args[0] if error.args else None
+    if not isinstance(payload, dict):
+        return False
+    if payload.get("name") == "REQUEST_VALIDATION_ERROR":
+        return True
+    cause = payload.get("cause")
+    return isinstance(cause, dict) and cause.get("name") in DETERMINISTIC_RPC_ERROR_CAUSES
+
+
+class EndpointStats:
+    """Latency and error counters for a single RPC endpoint"""
+
+    def __init__(self, url: str, latency_window: int):
+        self.url = url
+        self.ewma_latency: Optional[float] = None
+        self.requests = 0
+        self.errors = 0
+        self.consecutive_failures = 0
+        self.healthy = True
+        self.unhealthy_since = 0.0
+        self.last_error: Optional[str] = None
+        self.latencies = deque(maxlen=latency_window)
+
+    def latency_percentile(self, pct: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))]
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "healthy": self.healthy,
+            "requests": self.requests,
+            "errors": self.errors,
+            "consecutive_failures": self.consecutive_failures,
+            "ewma_latency": self.ewma_latency,
+            "p50_latency": self.latency_percentile(50),
+            "p99_latency": self.latency_percentile(99),
+            "last_error": self.last_error,
+        }
+
+
+class RpcEndpointPool:
+    """
+    Pool of interchangeable NEAR RPC endpoints.
+
+    Endpoints are ranked by an exponentially weighted moving average of their latency. Requests go to
+    the fastest healthy endpoint and fail over to the next one on error. An endpoint that fails
+    max_failures times in a row is marked unhealthy and skipped until cooldown seconds have passed, after
+    which it gets a single trial request. With hedge=True, async requests are also sent to the second
+    fastest endpoint after hedge_delay seconds and the first successful answer wins. Without a
+    hedge_delay, the hedge waits for the p95 latency of the fastest measured endpoint, so only slow
+    requests are duplicated.
+
+    Exceptions for which passthrough returns True mean the endpoint answered (e.g. a contract error), so
+    they are raised to the caller without failing over or counting against the endpoint.
+
+    Every health_interval seconds, the next request also starts a probe of every endpoint in the
+    background (see maybe_check_health), so latencies stay current and ejected endpoints that recovered
+    come back without waiting for a trial request.
+    """
+
+    def __init__(
+        self,
+        endpoints: List[str],
+        ewma_alpha: float = 0.3,
+        max_failures: int = 3,
+        cooldown: float = 30.0,
+        hedge: bool = False,
+        hedge_delay: Optional[float] = None,
+        latency_window: int = 256,
+        passthrough: Callable[[BaseException], bool] = lambda error: False,
+        health_interval: Optional[float] = 30.0,
+    ):
+        if not endpoints:
+            raise ValueError("At least one RPC endpoint is required")
+        self.endpoints = {url: EndpointStats(url, latency_window) for url in endpoints}
+        self.ewma_alpha = ewma_alpha
+        self.max_failures = max_failures
+        self.cooldown = cooldown
+        self.hedge = hedge
+        self.hedge_delay = hedge_delay
+        self.passthrough = passthrough
+        self.health_interval = health_interval
+        self._last_health_check = time.monotonic()
+        self._health_check_running = False
+        # Kept so the running health check task is not garbage collected before it finishes
+        self._health_task: Optional[asyncio.Task] = None
+        self._lock = threading.Lock()
+
+    def ranked(self) -> List[str]:
+        """Endpoints to try, fastest healthy first, then unhealthy ones whose cooldown expired"""
+        now = time.monotonic()
+        with self._lock:
+            healthy = [s for s in self.endpoints.values() if s.healthy]
+            retry = [
+                s
+                for s in self.endpoints.values()
+                if not s.healthy and now - s.unhealthy_since >= self.cooldown
+            ]
+        if not healthy and not retry:
+            # Everything is cooling down; trying the longest-failed endpoint beats failing outright
+            retry = sorted(self.endpoints.values(), key=lambda s: s.unhealthy_since)
+        # Endpoints without samples yet sort first so that every endpoint gets measured
+        healthy.sort(key=lambda s: -1.0 if s.ewma_latency is None else s.ewma_latency)
+        return [s.url for s in healthy + retry]
+
+    def record_success(self, url: str, latency: float):
+        with self._lock:
+            stats = self.endpoints[url]
+            stats.requests += 1
+            stats.latencies.append(latency)
+            if stats.ewma_latency is None:
+                stats.ewma_latency = latency
+            else:
+                stats.ewma_latency = (
+                    self.ewma_alpha * latency + (1 - self.ewma_alpha) * stats.ewma_latency
+                )
+            stats.consecutive_failures = 0
+            stats.healthy = True
+
+    def record_failure(self, url: str, error: BaseException):
+        with self._lock:
+            stats = self.endpoints[url]
+            stats.requests += 1
+            stats.errors += 1
+            stats.consecutive_failures += 1
+            stats.last_error = f"{type(error).__name__}: {error}"
+            if stats.healthy and stats.consecutive_failures >= self.max_failures:
+                stats.healthy = False
+                stats.unhealthy_since = time.monotonic()
+            elif not stats.healthy:
+                # A failed trial request restarts the cooldown
+                stats.unhealthy_since = time.monotonic()
+
+    def _no_endpoint_error(self, errors: List[BaseException]):
+        if not errors:
+            return NoHealthyEndpointError("No healthy RPC endpoint available")
+        return NoHealthyEndpointError(
+            f"All RPC endpoints failed, last error: {errors[-1]}"
+        )
+
+    def call(self, fn: Callable[[str], T]) -> T:
+        """Run fn(url) against the best endpoint, failing over in rank order"""
+        errors = []
+        for url in self.ranked():
+            start = time.perf_counter()
+            try:
+                result = fn(url)
+            except Exception as e:
+                if self.passthrough(e):
+                    self.record_success(url, time.perf_counter() - start)
+                    raise
+                self.record_failure(url, e)
+                errors.append(e)
+                continue
+            self.record_success(url, time.perf_counter() - start)
+            return result
+        raise self._no_endpoint_error(errors)
+
+    async def _attempt(self, fn: Callable[[str], Awaitable[T]], url: str) -> T:
+        start = time.perf_counter()
+        try:
+            result = await fn(url)
+        except Exception as e:
+            if self.passthrough(e):
+                self.record_success(url, time.perf_counter() - start)
+            else:
+                self.record_failure(url, e)
+            raise
+        self.record_success(url, time.perf_counter() - start)
+        return result
+
+    def _hedge_delay(self) -> float:
+        """Seconds to wait for the primary endpoint before hedging"""
+        if self.hedge_delay is not None:
+            return self.hedge_delay
+        with self._lock:
+            measured = [s for s in self.endpoints.values() if s.ewma_latency is not None]
+            if not measured:
+                # Until some endpoint has been measured, hedge right away
+                return 0.0
+            return min(measured, key=lambda s: s.ewma_latency).latency_percentile(95)
+
+    async def _hedged(
+        self, fn: Callable[[str], Awaitable[T]], primary: str, secondary: str
+    ) -> T:
+        tasks = [asyncio.create_task(self._attempt(fn, primary))]
+        try:
+            hedge_delay = self._hedge_delay()
+            if hedge_delay > 0:
+                await asyncio.wait(tasks, timeout=hedge_delay)
+            if tasks[0].done():
+                if tasks[0].exception() is None:
+                    return tasks[0].result()
+                if self.passthrough(tasks[0].exception()):
+                    raise tasks[0].exception()
+            tasks.append(asyncio.create_task(self._attempt(fn, secondary)))
+
+            pending = set(tasks)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    if self.passthrough(task.exception()):
+                        raise task.exception()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                if task.done():
+                    # Mark the loser's exception as retrieved
+                    task.cancelled() or task.exception()
+                else:
+                    task.cancel()
+
+    async def acall(self, fn: Callable[[str], Awaitable[T]]) -> T:
+        """Async version of call, optionally hedged across the two fastest endpoints"""
+        candidates = self.ranked()
+        errors = []
+        if self.hedge and len(candidates) >= 2:
+            try:
+                return await self._hedged(fn, candidates[0], candidates[1])
+            except Exception as e:
+                if self.passthrough(e):
+                    raise
+                errors.append(e)
+                candidates = candidates[2:]
+        for url in candidates:
+            try:
+                return await self._attempt(fn, url)
+            except Exception as e:
+                if self.passthrough(e):
+                    raise
+                errors.append(e)
+        raise self._no_endpoint_error(errors)
+
+    def check_health(self, probe: Callable[[str], Any]):
+        """Probe every endpoint once, updating latency and health"""
+        for url in self.endpoints:
+            start = time.perf_counter()
+            try:
+                probe(url)
+            except Exception as e:
+                self.record_failure(url, e)
+            else:
+                self.record_success(url, time.perf_counter() - start)
+
+    async def acheck_health(self, probe: Callable[[str], Awaitable[Any]]):
+        """Async version of check_health that probes all endpoints concurrently"""
+        await asyncio.gather(
+            *(self._attempt(probe, url) for url in self.endpoints),
+            return_exceptions=True,
+        )
+
+    def _health_check_due(self) -> bool:
+        if self.health_interval is None:
+            return False
+        with self._lock:
+            now = time.monotonic()
+            if self._health_check_running or now - self._last_health_check < self.health_interval:
+                return False
+            self._health_check_running = True
+            self._last_health_check = now
+            return True
+
+    def _health_check_done(self):
+        with self._lock:
+            self._health_check_running = False
+
+    def maybe_check_health(self, probe: Callable[[str], Any]):
+        """Start check_health on a background thread if health_interval has passed since the last one"""
+        if not self._health_check_due():
+            return
+
+        def run():
+            try:
+                self.check_health(probe)
+            finally:
+                self._health_check_done()
+
+        threading.Thread(target=run, name="rpc-health-check", daemon=True).start()
+
+    def amaybe_check_health(self, probe: Callable[[str], Awaitable[Any]]):
+        """Start acheck_health as a task of the running loop if health_interval has passed since the last one"""
+        if not self._health_check_due():
+            return
+        self._health_task = asyncio.get_running_loop().create_task(
+            self.acheck_health(probe)
+        )
+        self._health_task.add_done_callback(lambda _: self._health_check_done())
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Per-endpoint latency and error counters"""
+        with self._lock:
+            return {url: s.snapshot() for url, s in self.endpoints.items()}
+
+
+class PooledJsonProvider(near_api.providers.JsonProvider):
+    """near_api JsonProvider that routes every JSON-RPC request through an RpcEndpointPool"""
+
+    def __init__(self, pool: RpcEndpointPool, proxies=None):
+        super().__init__(next(iter(pool.endpoints)), proxies)
+        self.pool = pool
+
+    def rpc_addr(self) -> str:
+        return self.pool.ranked()[0]
+
+    def _json_rpc_at(self, rpc_addr: str, method, params, timeout):
+        j = {"method": method, "params": params, "id": "dontcare", "jsonrpc": "2.0"}
+        r = requests.post(rpc_addr, json=j, timeout=timeout, proxies=self.proxies)
+        r.raise_for_status()
+        content = json.loads(r.content)
+        if "error" in content:
+            raise near_api.providers.JsonProviderError(content["error"])
+        return content["result"]
+
+    def json_rpc(self, method, params, timeout=2.0):
+        self.pool.maybe_check_health(
+            lambda rpc_addr: self._json_rpc_at(rpc_addr, "status", [], timeout)
+        )
+        return self.pool.call(
+            lambda rpc_addr: self._json_rpc_at(rpc_addr, method, params, timeout)
+        )
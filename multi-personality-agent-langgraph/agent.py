@@ -15,7 +15,8 @@ from langchain_core.messages import SystemMessage, HumanMessage, AIMessage, Base
 from langchain_core.runnables import RunnableConfig
 
 from prompts import PROMPT_PM, PROMPT_SWE, PROMPT_TRAVEL, PROMPT_JOKER, PROMPT_ADHD, jokes
-from constants import PM_FILENAME, PERSONALITIES, DEFAULT_PERSONALITY
+from constants import PM_FILENAME, PERSONALITIES, DEFAULT_PERSONALITY, ROUTER_CONFIDENCE_THRESHOLD
+from router import get_router
 
 # Load environment variables
 from dotenv import load_dotenv
@@ -103,6 +104,11 @@ def write_file(filename: str, content: str) -> bool:
         return False
 
 
+# The local router answers most queries in microseconds; the LLM only classifies the ones it is unsure about
+USE_LOCAL_ROUTER = os.getenv("LOCAL_ROUTER", "True").lower() == "true"
+ROUTER_THRESHOLD = float(os.getenv("ROUTER_CONFIDENCE_THRESHOLD", str(ROUTER_CONFIDENCE_THRESHOLD)))
+
+
 def determine_personality(user_query: str) -> str:
     """
     Determine personality to trigger based on user query.
@@ -117,6 +123,26 @@ def determine_personality(user_query: str) -> str:
         logger.warning("Empty user query, defaulting to ADHD personality")
         return DEFAULT_PERSONALITY
 
+    if USE_LOCAL_ROUTER:
+        route = get_router().route(user_query)
+        if route.confidence >= ROUTER_THRESHOLD:
+            logger.info(f"Routed personality: {route.personality} (confidence {route.confidence:.2f})")
+            return route.personality
+        logger.info(f"Router unsure ({route.personality}, confidence {route.confidence:.2f}), asking the LLM")
+
+    return classify_personality_with_llm(user_query)
+
+
+def classify_personality_with_llm(user_query: str) -> str:
+    """
+    Determine personality to trigger based on user query, by asking the LLM.
+
+    Args:
+        user_query (str): The user's message
+
+    Returns:
+        str: The detected personality or default if detection fails
+    """
     try:
         prompt = f"""
         You are an agent that has multiple personalities: PM, travel agent, Joker, AI with ADHD, software developer
@@ -346,6 +372,9 @@ def handle_adhd_personality(messages: List[BaseMessage]):
 
 def create_agent_graph():
     """Create the LangGraph StateGraph for the multi-personality agent."""
+    if USE_LOCAL_ROUTER:
+        # Train the router now rather than on the first user turn
+        get_router()
     builder = StateGraph(MessagesState)
     builder.add_node("agent", multi_personality_agent)
     builder.add_edge(START, "agent")
@@ -1,4 +1,8 @@
 # Constants
 PM_FILENAME = "PM.md"
 PERSONALITIES = ["pm", "swe", "travel", "joker", "adhd"]
-DEFAULT_PERSONALITY = "adhd"
\ No newline at end of file
+DEFAULT_PERSONALITY = "adhd"
+
+# Queries the local router is less confident about than this are classified by the LLM. 0.65 is the lowest
+# threshold at which no out-of-domain query of router_data/dev.jsonl is routed locally to a wrong personality
+ROUTER_CONFIDENCE_THRESHOLD = 0.65
@@ -0,0 +1,264 @@
+import contextlib
+import hashlib
+import inspect
+import json
+import math
+import os
+import random
+import re
+import zlib
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from constants import PERSONALITIES
+
+ROUTER_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "router_data")
+TRAIN_PATH = os.path.join(ROUTER_DATA_DIR, "train.jsonl")
+# Held-out splits: the confidence threshold is tuned on DEV_PATH and accuracy is reported on EVAL_PATH
+DEV_PATH = os.path.join(ROUTER_DATA_DIR, "dev.jsonl")
+EVAL_PATH = os.path.join(ROUTER_DATA_DIR, "eval.jsonl")
+# Weights trained on TRAIN_PATH, reused by later processes until the training data changes
+WEIGHTS_PATH = os.path.join(ROUTER_DATA_DIR, "weights.json")
+
+NUM_BUCKETS = 2**18
+
+
+class Route(NamedTuple):
+    personality: str
+    confidence: float
+
+
+class EvalExample(NamedTuple):
+    text: str
+    personality: str
+    # False for queries outside what the personalities are trained on, which the router should leave to the LLM
+    in_domain: bool
+
+
+def load_examples(path: str) -> List[Tuple[str, str]]:
+    """
+    Load labelled routing examples.
+
+    Args:
+        path (str): A JSON lines file of {"text": ..., "personality": ...} objects
+
+    Returns:
+        List[Tuple[str, str]]: The (text, personality) pairs
+    """
+    examples = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                example = json.loads(line)
+                examples.append((example["text"], example["personality"]))
+    return examples
+
+
+def load_eval_examples(path: str) -> List[EvalExample]:
+    """
+    Load labelled evaluation examples.
+
+    Args:
+        path (str): A JSON lines file of {"text": ..., "personality": ..., "in_domain": ...} objects, where
+            in_domain is optional and defaults to true
+
+    Returns:
+        List[EvalExample]: The examples
+    """
+    examples = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                example = json.loads(line)
+                examples.append(
+                    EvalExample(
+                        example["text"],
+                        example["personality"],
+                        example.get("in_domain", True),
+                    )
+                )
+    return examples
+
+
+def features(text: str) -> List[int]:
+    """
+    Hash the word unigrams and bigrams and the character trigrams of a text into buckets.
+
+    Args:
+        text (str): The text to featurize
+
+    Returns:
+        List[int]: The bucket of every n-gram, with repeats
+    """
+    words = re.findall(r"[a-z0-9']+", text.lower())
+    grams = [f"w:{word}" for word in words]
+    grams += [f"b:{a} {b}" for a, b in zip(words, words[1:])]
+    for word in words:
+        padded = f" {word} "
+        grams += [f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2)]
+    return [zlib.crc32(gram.encode("utf-8")) % NUM_BUCKETS for gram in grams]
+
+
+class PersonalityRouter:
+    """
+    Multinomial logistic regression over hashed n-grams, which picks a personality in microseconds.
+
+    The confidence of a route is the probability the model gives its personality, so callers can fall
+    back to the LLM classification for the queries the model is unsure about.
+    """
+
+    def __init__(self, labels: List[str] = PERSONALITIES):
+        self.labels = list(labels)
+        self.weights: Dict[int, List[float]] = {}
+        self.bias = [0.0] * len(self.labels)
+
+    def _scores(self, buckets: List[int]) -> List[float]:
+        scores = list(self.bias)
+        for bucket in buckets:
+            row = self.weights.get(bucket)
+            if row is not None:
+                for i, weight in enumerate(row):
+                    scores[i] += weight
+        return scores
+
+    def _probabilities(self, buckets: List[int]) -> List[float]:
+        scores = self._scores(buckets)
+        top = max(scores)
+        exps = [math.exp(score - top) for score in scores]
+        total = sum(exps)
+        return [e / total for e in exps]
+
+    def train(
+        self,
+        examples: List[Tuple[str, str]],
+        epochs: int = 30,
+        learning_rate: float = 0.5,
+        l2: float = 1e-4,
+        seed: int = 0,
+    ) -> "PersonalityRouter":
+        """
+        Fit the model with stochastic gradient descent.
+
+        Args:
+            examples (List[Tuple[str, str]]): The (text, personality) pairs to learn from
+            epochs (int): Passes over the examples
+            learning_rate (float): Step size, decayed every epoch
+            l2 (float): Weight decay applied to the weights of each example's n-grams
+            seed (int): Seed of the example order, so training is reproducible
+
+        Returns:
+            PersonalityRouter: The router itself
+        """
+        data = [(features(text), self.labels.index(label)) for text, label in examples]
+        rng = random.Random(seed)
+        for epoch in range(epochs):
+            rng.shuffle(data)
+            rate = learning_rate / (1 + epoch)
+            for buckets, label in data:
+                probabilities = self._probabilities(buckets)
+                gradient = [
+                    p - (1.0 if i == label else 0.0) for i, p in enumerate(probabilities)
+                ]
+                # Each n-gram occurrence contributes, scaled so long texts do not take bigger steps
+                scale = rate / math.sqrt(max(1, len(buckets)))
+                for bucket in buckets:
+                    row = self.weights.setdefault(bucket, [0.0] * len(self.labels))
+                    for i, g in enumerate(gradient):
+                        row[i] -= scale * g + rate * l2 * row[i]
+                for i, g in enumerate(gradient):
+                    self.bias[i] -= rate * g
+        return self
+
+    def route(self, text: str) -> Route:
+        """
+        Pick the personality for a user query.
+
+        Args:
+            text (str): The user's message
+
+        Returns:
+            Route: The most likely personality and its probability
+        """
+        probabilities = self._probabilities(features(text))
+        best = max(range(len(self.labels)), key=probabilities.__getitem__)
+        return Route(self.labels[best], probabilities[best])
+
+    def save(self, path: str, key: str):
+        """
+        Write the weights to a JSON file.
+
+        Args:
+            path (str): The file to write
+            key (str): Identifies the training run, checked by load
+        """
+        state = {
+            "key": key,
+            "labels": self.labels,
+            "bias": self.bias,
+            "weights": {str(bucket): row for bucket, row in self.weights.items()},
+        }
+        # Written to a temporary file first, so concurrent processes never read half a file
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path: str, key: str) -> Optional["PersonalityRouter"]:
+        """
+        Read weights written by save.
+
+        Args:
+            path (str): The file to read
+            key (str): The training run the weights must come from
+
+        Returns:
+            Optional[PersonalityRouter]: The router, or None if the file is missing, unreadable or from
+                another training run
+        """
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if state.get("key") != key:
+            return None
+        router = cls(state["labels"])
+        router.bias = state["bias"]
+        router.weights = {int(bucket): row for bucket, row in state["weights"].items()}
+        return router
+
+
+def training_key(path: str) -> str:
+    """
+    Hash of everything the trained weights depend on, so cached weights are dropped when any of it changes.
+
+    Args:
+        path (str): The training data
+
+    Returns:
+        str: A hash of the training data, the labels, the number of buckets and the source of the feature
+            code and of PersonalityRouter, which holds the training algorithm and its default settings
+    """
+    with open(path, "rb") as f:
+        digest = hashlib.sha256(f.read())
+    digest.update(json.dumps([PERSONALITIES, NUM_BUCKETS]).encode("utf-8"))
+    for code in (features, PersonalityRouter):
+        digest.update(inspect.getsource(code).encode("utf-8"))
+    return digest.hexdigest()
+
+
+_router = None
+
+
+def get_router() -> PersonalityRouter:
+    """The router trained on the bundled examples. Weights saved by an earlier process are reused"""
+    global _router
+    if _router is None:
+        key = training_key(TRAIN_PATH)
+        _router = PersonalityRouter.load(WEIGHTS_PATH, key)
+        if _router is None:
+            _router = PersonalityRouter().train(load_examples(TRAIN_PATH))
+            # Without a writable data directory the router is simply trained again next time
+            with contextlib.suppress(OSError):
+                _router.save(WEIGHTS_PATH, key)
+    return _router